@@ -4,12 +4,15 @@ import random
 import numpy as np
 import tensorflow as tf
 
-from utils import capture, render_gif
+from utils import capture, render_gif, infer
 
 class DQNAgent:
     def __init__(self, config, sandbox, env, action_space):
         self.SANDBOX = sandbox
         self.ENV = env
+        self.ENV_NAME = config['env_name']
+        self.EVAL_ENV = None
+        self.RECORDER = None
         self.ACTION_SPACE = action_space
 
         self.EPSILON = config['epsilon']
@@ -24,15 +27,33 @@ class DQNAgent:
         self.UPDATE_TARGET_NETWORK = config['update_target_network']
         self.TAU = config['tau']
 
+        self.UPDATE_AFTER_ACTIONS = config['update_after_actions']
+        self.REPLAY_RATIO = config['replay_ratio']
+        self.REPLAY_CREDIT = 0.0
+        self.UPDATES = 0
+        self.LAST_LOSS = 0.0
+
+        # tau is tuned per frame, rescale it to the frames covered by one soft update
+        self.SOFT_TARGET_INTERVAL = config['soft_target_interval']
+        self.SOFT_FRAMES = max(config['update_after_actions'], 1 / config['replay_ratio']) * config['soft_target_interval']
+        self.SOFT_TAU = 1 - (1 - config['tau']) ** self.SOFT_FRAMES
+        self.SOFT_COUNT = 0
+
         self.DOUBLE = config['double']
         self.USE_PER = config['use_per']
 
+        self.STATE_SHAPE = (config['input_shape'][0], config['input_shape'][1], config['window_length'])
+        self.XLA = config['xla']
+        self.LOSS = tf.keras.losses.Huber()
+
+        self.TRAIN_STEP = None
+        self.TRAIN_MODELS = ()
+
+        self.SOFT_STEP = None
+        self.SOFT_MODELS = ()
+
     def get_action(self, state, model):
-        state_tensor = tf.convert_to_tensor(state)
-        state_tensor = tf.expand_dims(state_tensor, 0)
-        action_probs = model(state_tensor, training=False)
-        action = tf.argmax(action_probs[0]).numpy()
-        return action
+        return infer(model, state)
 
     def exploration(self, frame_count, state, model):
         if frame_count < self.EPSILON_RANDOM_FRAMES or self.EPSILON > np.random.rand(1)[0]:
@@ -44,82 +65,161 @@ class DQNAgent:
         self.EPSILON = max(self.EPSILON, self.EPSILON_MIN)
         return action_idx
 
-    def learn(self, memory, model, model_target, optimizer):
-        if self.USE_PER:
-            samples, indices, priorities = memory.sample(self.BATCH_SIZE)
-            action_sample, state_sample, state_next_sample, reward_sample, terminal_sample = samples
-        else:
-            action_sample, state_sample, state_next_sample, reward_sample, terminal_sample = memory.sample()
-
-        q = model.predict(state_next_sample)
-        target_q = model_target.predict(state_next_sample)
+    def target(self, model, model_target, state_next, reward, terminal):
+        q = model(state_next, training=False)
+        target_q = model_target(state_next, training=False)
 
         if self.DOUBLE:
             max_q = tf.argmax(q, axis=1)
             max_actions = tf.one_hot(max_q, self.ACTION_SPACE)
-            q_samp = reward_sample + self.GAMMA * tf.reduce_sum(tf.multiply(target_q, max_actions), axis=1)
+            q_samp = reward + self.GAMMA * tf.reduce_sum(tf.multiply(target_q, max_actions), axis=1)
         else:
-            q_samp = reward_sample + self.GAMMA * tf.reduce_max(target_q, axis=1)
+            q_samp = reward + self.GAMMA * tf.reduce_max(target_q, axis=1)
+
+        return q_samp * (1 - terminal) - terminal
 
-        q_samp = q_samp * (1 - terminal_sample) - terminal_sample
-        masks = tf.one_hot(action_sample, self.ACTION_SPACE)
+    def train_step(self, model, model_target, optimizer, action, state, state_next, reward, terminal, weights):
+        q_samp = self.target(model, model_target, state_next, reward, terminal)
+        masks = tf.one_hot(action, self.ACTION_SPACE)
 
         with tf.GradientTape() as tape:
-            q_values = model(state_sample)
+            q_values = model(state)
             q_action = tf.reduce_sum(tf.multiply(q_values, masks), axis=1)
-            loss = tf.keras.losses.Huber()(q_samp, q_action)
+            loss = self.LOSS(q_samp[:, tf.newaxis], q_action[:, tf.newaxis], sample_weight=weights)
 
         grads = tape.gradient(loss, model.trainable_variables)
         optimizer.apply_gradients(zip(grads, model.trainable_variables))
 
+        td_error = abs(q_action - q_samp) + 0.1
+        return loss, td_error
+
+    def trainer(self, model, model_target, optimizer):
+        models = (model, model_target, optimizer)
+        if len(self.TRAIN_MODELS) == len(models) and all(a is b for a, b in zip(models, self.TRAIN_MODELS)):
+            return self.TRAIN_STEP
+
+        signature = [
+            tf.TensorSpec((None, None), tf.int32),
+            tf.TensorSpec((None, None) + self.STATE_SHAPE, tf.float32),
+            tf.TensorSpec((None, None) + self.STATE_SHAPE, tf.float32),
+            tf.TensorSpec((None, None), tf.float32),
+            tf.TensorSpec((None, None), tf.float32),
+            tf.TensorSpec((None, None), tf.float32)]
+
+        # Create the optimizer slots up front so the step traces only once
+        if hasattr(optimizer, 'build'):
+            optimizer.build(model.trainable_variables)
+
+        def steps(action, state, state_next, reward, terminal, weights):
+            count = tf.shape(action)[0]
+            losses = tf.TensorArray(tf.float32, size=count)
+            td_errors = tf.TensorArray(tf.float32, size=count)
+
+            for i in tf.range(count):
+                loss, td_error = self.train_step(model, model_target, optimizer, action[i], state[i], state_next[i], reward[i], terminal[i], weights[i])
+                losses = losses.write(i, loss)
+                td_errors = td_errors.write(i, td_error)
+
+            return losses.stack(), td_errors.stack()
+
+        self.TRAIN_STEP = tf.function(steps, input_signature=signature, jit_compile=self.XLA)
+        self.TRAIN_MODELS = models
+        return self.TRAIN_STEP
+
+    def learn(self, memory, model, model_target, optimizer):
+        self.REPLAY_CREDIT += self.REPLAY_RATIO * self.UPDATE_AFTER_ACTIONS
+        self.UPDATES = int(self.REPLAY_CREDIT)
+        self.REPLAY_CREDIT -= self.UPDATES
+
+        if self.UPDATES == 0:
+            return self.LAST_LOSS
+
+        batches, indices = [], []
+        for _ in range(self.UPDATES):
+            if self.USE_PER:
+                samples, idx, weights = memory.sample(self.BATCH_SIZE)
+                indices.append(idx)
+            else:
+                samples = memory.sample()
+                weights = np.ones(self.BATCH_SIZE, dtype=np.float32)
+            batches.append(tuple(samples) + (weights,))
+
+        dtypes = (tf.int32, tf.float32, tf.float32, tf.float32, tf.float32, tf.float32)
+        batch = [tf.stack([tf.cast(b[i], dtype) for b in batches]) for i, dtype in enumerate(dtypes)]
+
+        losses, td_error = self.trainer(model, model_target, optimizer)(*batch)
+
         if self.USE_PER:
-            td_error = abs(q_action - q_samp) + 0.1
-            memory.update(indices, td_error)
+            memory.update(np.concatenate(indices), tf.reshape(td_error, [-1]))
 
-        return float(loss)
+        self.LAST_LOSS = float(tf.reduce_mean(losses))
+        return self.LAST_LOSS
 
     def fixed_target(self, frame_count, model, model_target):
         if frame_count % self.UPDATE_TARGET_NETWORK == 0:
             model_target.set_weights(model.get_weights())
 
-    def soft_target(self, target_weights, weights):
-        for (a, b) in zip(target_weights, weights):
-            a.assign(b * self.TAU + a * (1 - self.TAU))
+    def polyak(self, model, model_target):
+        models = (model, model_target)
+        if len(self.SOFT_MODELS) == len(models) and all(a is b for a, b in zip(models, self.SOFT_MODELS)):
+            return self.SOFT_STEP
 
-    def td_error(self, model, model_target, action, state, state_next, reward, terminal):
-        state = tf.expand_dims(state, 0)
-        state_next = tf.expand_dims(state_next, 0)
+        tau = tf.constant(self.SOFT_TAU, dtype=tf.float32)
 
-        q = model.predict(state_next)[0]
-        target_q = model_target.predict(state_next)
+        @tf.function
+        def step():
+            for (a, b) in zip(model_target.trainable_variables, model.trainable_variables):
+                a.assign(b * tau + a * (1 - tau))
 
-        if self.DOUBLE:
-            max_q = np.argmax(q)
-            max_actions = tf.one_hot(max_q, self.ACTION_SPACE)
-            q_samp = reward + self.GAMMA * tf.reduce_sum(tf.multiply(target_q, max_actions), axis=1)
-        else:
-            q_samp = reward + self.GAMMA * tf.reduce_max(target_q, axis=1)
+        self.SOFT_STEP = step
+        self.SOFT_MODELS = models
+        return self.SOFT_STEP
+
+    def soft_target(self, model, model_target):
+        self.SOFT_COUNT += 1
+        if self.SOFT_COUNT % self.SOFT_TARGET_INTERVAL == 0:
+            self.polyak(model, model_target)()
 
-        q_samp = q_samp * (1 - terminal) - terminal
+    def td_error(self, model, model_target, action, state, state_next, reward, terminal):
+        q_samp = self.target(model, model_target, state_next, reward, terminal)
         masks = tf.one_hot(action, self.ACTION_SPACE)
 
-        q_values = model(state)
+        q_values = model(state, training=False)
         q_action = tf.reduce_sum(tf.multiply(q_values, masks), axis=1)
 
         td_error = abs(q_action - q_samp) + 0.1
         return td_error
 
+    def prioritize(self, memory, model, model_target):
+        if not memory.PENDING:
+            return
+
+        samples, indices = memory.pending()
+        td_error = self.td_error(model, model_target, *samples)
+        memory.update(indices, td_error)
+
+    def evaluation_env(self):
+        if self.EVAL_ENV is None:
+            self.EVAL_ENV, _ = self.SANDBOX.build_env(self.ENV_NAME, profile='human')
+        return self.EVAL_ENV
+
     def evaluate(self, model, log_dir, episode_id):
-        terminal, state, info = self.SANDBOX.reset(self.ENV)
+        env = self.evaluation_env()
+        terminal, state, info = self.SANDBOX.reset(env)
         prev_info = info
 
+        if self.RECORDER:
+            self.RECORDER.record(state, info=info, start=True)
+
         frames = []
         episode_reward = 0
 
         while True:
-            frames = capture(self.ENV, self.SANDBOX, frames)
+            frames = capture(env, self.SANDBOX, frames)
             action = self.get_action(state, model)
-            state_next, reward, terminal, info = self.SANDBOX.step(self.ENV, action, prev_info)
+            state_next, reward, terminal, info = self.SANDBOX.step(env, action, prev_info)
+            if self.RECORDER:
+                self.RECORDER.record(state_next, action, reward, terminal, info)
 
             episode_reward += reward
 
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('..')
+
+import time
+import numpy as np
+import tensorflow as tf
+
+from sum_tree import SumTree
+from networks import dueling_dqn
+from agent import DQNAgent
+from memory import PrioritizedReplayMemory
+from wrappers.synthetic import Sandbox
+from utils import infer, load_config
+
+# -----------------------------
+
+class RecursiveSumTree:
+    def __init__(self, capacity):
+        self.CAPACITY = capacity
+        self.TREE = np.zeros(2 * capacity - 1)
+
+    def propagate(self, idx, change):
+        parent = (idx - 1) // 2
+        self.TREE[parent] += change
+
+        if parent != 0:
+            self.propagate(parent, change)
+
+    def retrieve(self, idx, s):
+        left = 2 * idx + 1
+        right = left + 1
+
+        if left >= len(self.TREE):
+            return idx
+
+        if s <= self.TREE[left]:
+            return self.retrieve(left, s)
+        else:
+            return self.retrieve(right, s - self.TREE[left])
+
+    def fill(self, priorities):
+        self.TREE[self.CAPACITY - 1:] = priorities
+        for i in reversed(range(self.CAPACITY - 1)):
+            self.TREE[i] = self.TREE[2 * i + 1] + self.TREE[2 * i + 2]
+
+    def sample(self, s):
+        return [self.retrieve(0, x) for x in s]
+
+    def update(self, indices, priorities):
+        for idx, priority in zip(indices, priorities):
+            change = priority - self.TREE[idx]
+            self.TREE[idx] = priority
+            self.propagate(idx, change)
+
+def timeit(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+def sum_tree_benchmark(capacities=(100000, 1000000), batch_sizes=(32, 256), repeats=200):
+    for capacity, batch_size in [(c, b) for c in capacities for b in batch_sizes]:
+        priorities = np.random.uniform(0.01, 1.0, size=capacity)
+
+        recursive = RecursiveSumTree(capacity)
+        recursive.fill(priorities)
+
+        vectorized = SumTree(capacity)
+        vectorized.update(np.arange(capacity), priorities)
+
+        def batch(tree):
+            return (np.arange(batch_size) + np.random.uniform(size=batch_size)) * tree.TREE[0] / batch_size
+
+        def recursive_step():
+            indices = recursive.sample(batch(recursive))
+            recursive.update(indices, np.random.uniform(0.01, 1.0, size=batch_size))
+
+        def vectorized_step():
+            indices = vectorized.get(batch(vectorized))
+            vectorized.update(indices, np.random.uniform(0.01, 1.0, size=batch_size))
+
+        print("Capacity: {}, Batch: {}, Recursive: {:.3f} ms, Vectorized: {:.3f} ms".format(
+            capacity, batch_size, timeit(recursive_step, repeats), timeit(vectorized_step, repeats)))
+
+def action_benchmark(input_shape=(84, 84), window_length=4, action_space=3, repeats=500):
+    model = dueling_dqn(input_shape, window_length, action_space)
+    state = np.random.rand(input_shape[0], input_shape[1], window_length).astype(np.float32)
+
+    def eager_step():
+        state_tensor = tf.expand_dims(tf.convert_to_tensor(state), 0)
+        return tf.argmax(model(state_tensor, training=False)[0]).numpy()
+
+    def compiled_step():
+        return infer(model, state)
+
+    eager_step()
+    compiled_step()
+    print("Action latency, Eager: {:.3f} ms, Compiled: {:.3f} ms".format(timeit(eager_step, repeats), timeit(compiled_step, repeats)))
+
+def training_benchmark(step_costs=(0.0, 0.001), frames=2000):
+    for step_cost in step_costs:
+        config = dict(load_config('config.yml')['synthetic-dqn'], synthetic_step_cost=step_cost, update_after_actions=4, replay_ratio=0.25)
+
+        sandbox = Sandbox(config)
+        env, action_space = sandbox.build_env(config['env_name'])
+
+        model = dueling_dqn(config['input_shape'], config['window_length'], action_space)
+        model_target = dueling_dqn(config['input_shape'], config['window_length'], action_space)
+        optimizer = tf.keras.optimizers.Adam(learning_rate=config['learning_rate'])
+
+        agent = DQNAgent(config, sandbox, env, action_space)
+        memory = PrioritizedReplayMemory(config)
+
+        terminal, state, info = sandbox.reset(env)
+        start = time.perf_counter()
+        for frame_count in range(frames):
+            action = agent.exploration(frame_count, state, model)
+            state_next, reward, terminal, info = sandbox.step(env, action, info)
+            memory.push(action, state, state_next, reward, terminal)
+            state = state_next
+
+            if frame_count % config['update_after_actions'] == 0 and frame_count > config['batch_size']:
+                agent.learn(memory, model, model_target, optimizer)
+
+        print("Training loop, Step cost: {:.1f} ms, Throughput: {:.1f} frames/s".format(step_cost * 1000.0, frames / (time.perf_counter() - start)))
+
+# -----------------------------
+
+sum_tree_benchmark()
+action_benchmark()
+training_benchmark()
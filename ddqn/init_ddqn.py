@@ -9,8 +9,11 @@ import tensorflow as tf
 from wrappers.doom import Sandbox
 from agent import DQNAgent
 from memory import ExperienceReplayMemory, PrioritizedReplayMemory
+from prefetch import Prefetcher
+from offline import OfflineMemory
 from networks import dqn, dueling_dqn
-from utils import load_config, log_feedback
+from utils import load_config, log_feedback, checkpoint, load
+from trajectory import TrajectoryRecorder
 
 # -----------------------------
 
@@ -24,6 +27,9 @@ print("Eager mode:", tf.executing_eagerly())
 config = load_config('config.yml')['doom-dqn-defend_the_center']
 log_dir = "metrics/"
 
+if config['offline']:
+    config['use_per'] = False
+
 # -----------------------------
 
 sandbox = Sandbox(config)
@@ -37,19 +43,39 @@ optimizer = tf.keras.optimizers.Adam(learning_rate=config['learning_rate'])
 
 agent = DQNAgent(config, sandbox, env, action_space)
 
-if config['use_per']:
-    memory = PrioritizedReplayMemory(config)
-else:
-    memory = ExperienceReplayMemory(config)
-
 # -----------------------------
 
-timestamp, summary_writer = log_feedback(log_dir)
+timestamp, summary_writer = log_feedback(log_dir, config['resume'])
 print("Job ID:", timestamp)
 
+if config['record']:
+    recorder = TrajectoryRecorder(log_dir + timestamp + '/trajectories/train', config['record_shard_size'], config['record_compress'])
+    agent.RECORDER = TrajectoryRecorder(log_dir + timestamp + '/trajectories/evaluate', config['record_shard_size'], config['record_compress'])
+
+if config['offline']:
+    memory = OfflineMemory(config, config['offline'])
+elif config['use_per']:
+    memory = PrioritizedReplayMemory(config, log_dir + timestamp)
+else:
+    memory = ExperienceReplayMemory(config, log_dir + timestamp)
+
+if config['memory_prefetch'] and not config['offline']:
+    memory = Prefetcher(memory, config['memory_prefetch'], *([config['batch_size']] if config['use_per'] else []))
+
 frame_count = 0
 episode_count = 0
 
+if config['resume']:
+    episode_id = checkpoint(log_dir + timestamp)
+    if episode_id is not None:
+        model.set_weights(load(log_dir + timestamp, episode_id).get_weights())
+        model_target.set_weights(model.get_weights())
+
+    if config['memory_mmap'] and not config['offline']:
+        frame_count = memory.PROGRESS.get('frame_count', 0)
+        episode_count = memory.PROGRESS.get('episode_count', 0)
+        agent.EPSILON = memory.PROGRESS.get('epsilon', agent.EPSILON)
+
 loss = 0
 
 episode_reward_history = []
@@ -62,69 +88,101 @@ max_life = 0
 
 # -----------------------------
 
-print("Training...")
-terminal, state, info = sandbox.reset(env)
-prev_info = info
+if config['offline']:
+    print("Training offline...")
+    while frame_count < config['offline_frames']:
+        if frame_count % config['update_after_actions'] == 0 and frame_count > config['batch_size']:
+            loss = agent.learn(memory, model, model_target, optimizer)
+            if agent.UPDATES and not config['fixed']:
+                agent.soft_target(model, model_target)
+
+        if config['fixed']:
+            agent.fixed_target(frame_count, model, model_target)
 
-while True:
-    action = agent.exploration(frame_count, state, model)
-    state_next, reward, terminal, info = sandbox.step(env, action, prev_info)
+        if frame_count % config['offline_interval'] == 0:
+            episode_count += 1
+            agent.save(model, model_target, log_dir + timestamp, episode_count)
+            eval_reward = agent.evaluate(model, (log_dir + timestamp), episode_count)
+            print("Frame: {}, Checkpoint: {}, Eval Reward: {}, Loss: {}".format(frame_count, episode_count, eval_reward, loss))
+
+            with summary_writer.as_default():
+                tf.summary.scalar('loss', loss, step=episode_count)
+                tf.summary.scalar('eval_reward', eval_reward, step=episode_count)
+
+        frame_count += 1
+else:
+    print("Training...")
+    terminal, state, info = sandbox.reset(env)
+    prev_info = info
+
+    if config['record']:
+        recorder.record(state, info=info, start=True)
+
+    while True:
+        action = agent.exploration(frame_count, state, model)
+        state_next, reward, terminal, info = sandbox.step(env, action, prev_info)
+        if config['record']:
+            recorder.record(state_next, action, reward, terminal, info)
 
-    if config['use_per']:
-        event = (action, state, state_next, reward, terminal)
-        td_error = agent.td_error(model, model_target, action, state, state_next, reward, terminal)
-        memory.push(event, td_error)
-    else:
         memory.push(action, state, state_next, reward, terminal)
+        if config['use_per'] and config['memory_priority_interval'] and frame_count % config['memory_priority_interval'] == 0:
+            agent.prioritize(memory, model, model_target)
 
-    if terminal:
-        episode_reward = 0
-        episode_count += 1
+        if terminal:
+            episode_reward = 0
+            episode_count += 1
 
-        max_life = max(life, max_life)
-        life = 0
-    else:
-        episode_reward += reward
-        life += 1
+            max_life = max(life, max_life)
+            life = 0
+        else:
+            episode_reward += reward
+            life += 1
 
-    prev_info = info
-    state = state_next
+        prev_info = info
+        state = state_next
+
+        if frame_count % config['update_after_actions'] == 0 and frame_count > config['batch_size']:
+            loss = agent.learn(memory, model, model_target, optimizer)
+            if agent.UPDATES and not config['fixed']:
+                agent.soft_target(model, model_target)
+
+        if config['fixed']:
+            agent.fixed_target(frame_count, model, model_target)
 
-    if frame_count % config['update_after_actions'] == 0 and frame_count > config['batch_size']:
-        loss = agent.learn(memory, model, model_target, optimizer)
+        episode_reward_history.append(episode_reward)
+        if len(episode_reward_history) > 100:
+            del episode_reward_history[:1]
+        running_reward = np.mean(episode_reward_history)
 
-    if config['fixed']:
-        agent.fixed_target(frame_count, model, model_target)
-    else:
-        agent.soft_target(model_target.trainable_variables, model.trainable_variables)
+        if terminal and config['memory_mmap']:
+            memory.sync({'frame_count': frame_count, 'episode_count': episode_count, 'epsilon': float(agent.EPSILON)})
 
-    if not config['use_per']:
-        memory.limit()
+        if terminal:
+            print("Frame: {}, Episode: {}, Reward: {}, Loss: {}, Max Life: {}".format(frame_count, episode_count, running_reward, loss, max_life))
 
-    episode_reward_history.append(episode_reward)
-    if len(episode_reward_history) > 100:
-        del episode_reward_history[:1]
-    running_reward = np.mean(episode_reward_history)
+        with summary_writer.as_default():
+            tf.summary.scalar('loss', loss, step=episode_count)
+            tf.summary.scalar('running_reward', running_reward, step=episode_count)
+            tf.summary.scalar('eval_reward', eval_reward, step=episode_count)
+            tf.summary.scalar('max_life', max_life, step=episode_count)
 
-    if terminal:
-        print("Frame: {}, Episode: {}, Reward: {}, Loss: {}, Max Life: {}".format(frame_count, episode_count, running_reward, loss, max_life))
+        if terminal and running_reward > (min_reward + 0.1) or terminal and episode_count % 100 == 1:
+            agent.save(model, model_target, log_dir + timestamp, episode_count)
+            eval_reward = agent.evaluate(model, (log_dir + timestamp), episode_count)
+            min_reward = running_reward
 
-    with summary_writer.as_default():
-        tf.summary.scalar('loss', loss, step=episode_count)
-        tf.summary.scalar('running_reward', running_reward, step=episode_count)
-        tf.summary.scalar('eval_reward', eval_reward, step=episode_count)
-        tf.summary.scalar('max_life', max_life, step=episode_count)
+        if eval_reward >= config['min_max'][1]:
+            agent.save(model, model_target, log_dir + timestamp, episode_count)
+            print("Solved at episode {}!".format(episode_count))
+            break
 
-    if terminal and running_reward > (min_reward + 0.1) or terminal and episode_count % 100 == 1:
-        agent.save(model, model_target, log_dir + timestamp, episode_count)
-        eval_reward = agent.evaluate(model, (log_dir + timestamp), episode_count)
-        min_reward = running_reward
+        frame_count += 1
 
-    if eval_reward >= config['min_max'][1]:
-        agent.save(model, model_target, log_dir + timestamp, episode_count)
-        print("Solved at episode {}!".format(episode_count))
-        break
+if config['memory_prefetch'] and not config['offline']:
+    memory.close()
 
-    frame_count += 1
+if config['record']:
+    recorder.close()
+    agent.RECORDER.close()
 
 env.close()
@@ -1,94 +1,298 @@
 #!/usr/bin/env python3
 
-import random
+import os, yaml, zlib
 import numpy as np
 import tensorflow as tf
 
-from sum_tree import SumTree
+from collections import OrderedDict
+
+from sum_tree import SumTree, MinTree
 
 class ExperienceReplayMemory:
-    def __init__(self, config):
+    META = ['WRITE_INDEX', 'FULL']
+
+    def __init__(self, config, outdir=None):
         self.MAX_MEMORY_LENGTH = config['memory_capacity']
         self.BATCH_SIZE = config['batch_size']
+        self.WINDOW_LENGTH = config['window_length']
+        self.STATE_SHAPE = (config['input_shape'][0], config['input_shape'][1], config['window_length'])
+        self.FRAMES = config['memory_frames']
+        self.COMPRESS = config['memory_compress']
+        self.CACHE_SIZE = config['memory_cache']
+        self.CACHE = OrderedDict()
+
+        self.MMAP = config['memory_mmap']
+        self.OUTDIR = outdir
+        self.ARRAYS = []
+        self.PROGRESS = {}
+
+        self.FULL = False
+        self.WRITE_INDEX = 0
+
+        self.action_history = self.allocate('action', (self.MAX_MEMORY_LENGTH,), np.int32)
+        self.reward_history = self.allocate('reward', (self.MAX_MEMORY_LENGTH,), np.float32)
+        self.terminal_history = self.allocate('terminal', (self.MAX_MEMORY_LENGTH,), bool)
+
+        if self.COMPRESS and (not self.FRAMES or self.MMAP):
+            raise ValueError("memory_compress requires memory_frames and is not supported with memory_mmap")
+
+        if self.COMPRESS:
+            self.frame_history = np.empty(self.MAX_MEMORY_LENGTH, dtype=object)
+            self.valid_history = self.allocate('valid', (self.MAX_MEMORY_LENGTH,), bool)
+        elif self.FRAMES:
+            self.frame_history = self.allocate('frame', (self.MAX_MEMORY_LENGTH,) + self.STATE_SHAPE[:2], np.uint8)
+            self.valid_history = self.allocate('valid', (self.MAX_MEMORY_LENGTH,), bool)
+        else:
+            self.state_history = self.allocate('state', (self.MAX_MEMORY_LENGTH,) + self.STATE_SHAPE, np.uint8)
+            self.state_next_history = self.allocate('state_next', (self.MAX_MEMORY_LENGTH,) + self.STATE_SHAPE, np.uint8)
+
+        if self.MMAP:
+            self.restore()
+
+    def allocate(self, name, shape, dtype):
+        if not self.MMAP:
+            return np.zeros(shape, dtype=dtype)
+
+        memory_dir = os.path.join(self.OUTDIR, 'memory')
+        os.makedirs(memory_dir, exist_ok=True)
+        path = os.path.join(memory_dir, name + '.npy')
+
+        if os.path.exists(path):
+            array = np.lib.format.open_memmap(path, mode='r+')
+            if array.shape != shape or array.dtype != np.dtype(dtype):
+                raise ValueError("Replay file {} has shape {} {}, expected {} {}".format(path, array.shape, array.dtype, shape, np.dtype(dtype)))
+        else:
+            array = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+
+        self.ARRAYS.append(array)
+        return array
+
+    def restore(self):
+        path = os.path.join(self.OUTDIR, 'memory', 'memory.yml')
+        if not os.path.exists(path):
+            return
+
+        with open(path) as f:
+            meta = yaml.full_load(f)
+
+        for name in self.META:
+            setattr(self, name, meta.get(name.lower(), getattr(self, name)))
+        self.PROGRESS = meta['progress']
+
+    def sync(self, progress=None):
+        if not self.MMAP:
+            return
+
+        for array in self.ARRAYS:
+            array.flush()
+
+        meta = {name.lower(): getattr(self, name) for name in self.META}
+        meta['progress'] = dict(progress or {})
+        path = os.path.join(self.OUTDIR, 'memory', 'memory.yml')
+        with open(path + '.tmp', 'w') as f:
+            yaml.dump(meta, f)
+        os.replace(path + '.tmp', path)
+
+    def current_length(self):
+        if self.FULL:
+            return self.MAX_MEMORY_LENGTH
+        else:
+            return self.WRITE_INDEX
+
+    def advance(self):
+        idx = self.WRITE_INDEX
+
+        self.WRITE_INDEX += 1
+        if self.WRITE_INDEX >= self.MAX_MEMORY_LENGTH:
+            self.WRITE_INDEX = 0
+            self.FULL = True
+        return idx
+
+    def quantize(self, frame):
+        return np.uint8(np.clip(frame, 0.0, 1.0) * 255.0 + 0.5)
+
+    def cache(self, idx, frame):
+        self.CACHE[idx] = frame
+        self.CACHE.move_to_end(idx)
+        if len(self.CACHE) > self.CACHE_SIZE:
+            self.CACHE.popitem(last=False)
+
+    def decompress(self, idx):
+        if idx in self.CACHE:
+            self.CACHE.move_to_end(idx)
+            return self.CACHE[idx]
+
+        frame = np.frombuffer(zlib.decompress(self.frame_history[idx]), dtype=np.uint8).reshape(self.STATE_SHAPE[:2])
+        self.cache(idx, frame)
+        return frame
+
+    def write_frame(self, idx, frame):
+        if not self.COMPRESS:
+            self.frame_history[idx] = frame
+            return
+
+        self.frame_history[idx] = zlib.compress(frame.tobytes(), self.COMPRESS)
+        self.cache(idx, frame)
+
+    def read_frames(self, offsets):
+        if not self.COMPRESS:
+            return self.frame_history[offsets]
+
+        unique, inverse = np.unique(offsets, return_inverse=True)
+        frames = np.stack([self.decompress(i) for i in unique])
+        return frames[inverse.reshape(offsets.shape)]
+
+    def store_frame(self, frame, valid):
+        idx = self.advance()
+        self.write_frame(idx, self.quantize(frame))
 
-        self.action_history = []
-        self.state_history = []
-        self.state_next_history = []
-        self.reward_history = []
-        self.terminal_history = []
+        # Slots whose window reaches back over idx lost a frame of their history
+        self.valid_history[(idx + np.arange(1, self.WINDOW_LENGTH + 1)) % self.MAX_MEMORY_LENGTH] = False
+        self.valid_history[idx] = valid
+        return idx
+
+    def continues(self, state):
+        if self.current_length() == 0:
+            return False
+
+        last = (self.WRITE_INDEX - 1) % self.MAX_MEMORY_LENGTH
+        return np.array_equal(self.quantize(state), self.frames(np.array([last]))[1][0])
+
+    def store(self, state, state_next):
+        if not self.FRAMES:
+            idx = self.advance()
+            self.state_history[idx] = self.quantize(state)
+            self.state_next_history[idx] = self.quantize(state_next)
+            return idx
+
+        if not self.continues(state):
+            for i in reversed(range(self.WINDOW_LENGTH)):
+                self.store_frame(state[:,:,i], False)
+        return self.store_frame(state_next[:,:,0], True)
+
+    def frames(self, indices):
+        offsets = (indices[:, np.newaxis] - np.arange(self.WINDOW_LENGTH + 1)) % self.MAX_MEMORY_LENGTH
+        window = np.moveaxis(self.read_frames(offsets), 1, -1)
+        return window[..., 1:], window[..., :self.WINDOW_LENGTH]
+
+    def stacks(self, indices):
+        if self.FRAMES:
+            state, state_next = self.frames(indices)
+        else:
+            state, state_next = self.state_history[indices], self.state_next_history[indices]
+        return state.astype(np.float32) / 255.0, state_next.astype(np.float32) / 255.0
 
     def push(self, action, state, state_next, reward, terminal):
-        self.action_history.append(action)
-        self.state_history.append(state)
-        self.state_next_history.append(state_next)
-        self.reward_history.append(reward)
-        self.terminal_history.append(terminal)
+        idx = self.store(state, state_next)
 
-    def sample(self):
-        indices = np.random.choice(range(len(self.terminal_history)), size=self.BATCH_SIZE)
+        self.action_history[idx] = action
+        self.reward_history[idx] = reward
+        self.terminal_history[idx] = terminal
+        return idx
+
+    def sample_indices(self, batch_size):
+        indices = np.random.randint(self.current_length(), size=batch_size)
+        if not self.FRAMES:
+            return indices
 
-        action_sample = [self.action_history[i] for i in indices]
-        state_sample = np.array([self.state_history[i] for i in indices])
-        state_next_sample = np.array([self.state_next_history[i] for i in indices])
-        reward_sample = [self.reward_history[i] for i in indices]
-        terminal_sample = tf.convert_to_tensor([float(self.terminal_history[i]) for i in indices])
+        invalid = ~self.valid_history[indices]
+        while invalid.any():
+            indices[invalid] = np.random.randint(self.current_length(), size=invalid.sum())
+            invalid = ~self.valid_history[indices]
+        return indices
+
+    def gather(self, indices):
+        action_sample = self.action_history[indices]
+        state_sample, state_next_sample = self.stacks(indices)
+        reward_sample = self.reward_history[indices]
+        terminal_sample = tf.convert_to_tensor(self.terminal_history[indices].astype(np.float32))
         return action_sample, state_sample, state_next_sample, reward_sample, terminal_sample
 
-    def limit(self):
-        if len(self.terminal_history) > self.MAX_MEMORY_LENGTH:
-            del self.action_history[:1]
-            del self.state_history[:1]
-            del self.state_next_history[:1]
-            del self.reward_history[:1]
-            del self.terminal_history[:1]
+    def sample(self):
+        return self.gather(self.sample_indices(self.BATCH_SIZE))
 
     def fetch(self):
-        return self.action_history, self.state_history, self.state_next_history, self.reward_history, self.terminal_history
+        indices = (np.arange(self.current_length()) + self.WRITE_INDEX * self.FULL) % self.MAX_MEMORY_LENGTH
+        if self.FRAMES:
+            indices = indices[self.valid_history[indices]]
+
+        state, state_next = self.stacks(indices)
+        return self.action_history[indices], state, state_next, self.reward_history[indices], self.terminal_history[indices]
+
+class PrioritizedReplayMemory(ExperienceReplayMemory):
+    META = ExperienceReplayMemory.META + ['MAX_PRIORITY', 'BETA']
 
-class PrioritizedReplayMemory:
-    def __init__(self, config):
-        self.TREE = SumTree(config['memory_capacity'])
+    def __init__(self, config, outdir=None):
         self.ALPHA = config['memory_alpha']
         self.EPS = config['memory_eps']
 
+        self.MAX_PRIORITY = 1.0
+        self.DEFERRED = bool(config['memory_priority_interval'])
+        self.PENDING = []
+
+        self.BETA = config['memory_beta']
+        self.BETA_ANNEALER = (1.0 - config['memory_beta']) / config['memory_beta_frames']
+
+        super().__init__(config, outdir)
+
+        self.TREE = SumTree(self.MAX_MEMORY_LENGTH)
+        self.MIN_TREE = MinTree(self.MAX_MEMORY_LENGTH)
+
+        if self.MMAP:
+            self.TREE.TREE = self.allocate('priority_sum', self.TREE.TREE.shape, np.float64)
+            self.MIN_TREE.TREE = self.allocate('priority_min', self.MIN_TREE.TREE.shape, np.float64)
+            if self.current_length() == 0:
+                self.MIN_TREE.TREE[:] = np.inf
+
     def get_priority(self, td_error):
         return(td_error + self.EPS) ** self.ALPHA
 
-    def current_length(self):
-        return self.TREE.current_length()
-
     def total_sum(self):
         return self.TREE.total_sum()
 
-    def push(self, event, td_error):
-        priority = self.get_priority(td_error)
-        self.TREE.insert(event, priority)
+    def prioritise(self, idx, priority):
+        self.TREE.update(idx, priority)
+        self.MIN_TREE.update(idx, np.where(np.reshape(priority, -1) > 0, priority, np.inf))
 
-    def sample(self, batch_size):
-        batch = []
-        indices = []
-        priorities = []
-        segment = self.TREE.total_sum() / batch_size
+    def store_frame(self, frame, valid):
+        idx = super().store_frame(frame, valid)
+
+        invalid = (idx + np.arange(0 if valid else 1, self.WINDOW_LENGTH + 1)) % self.MAX_MEMORY_LENGTH
+        self.prioritise(invalid, np.zeros(len(invalid)))
+        return idx
+
+    def push(self, action, state, state_next, reward, terminal, td_error=None):
+        idx = super().push(action, state, state_next, reward, terminal)
+
+        if td_error is None:
+            if self.DEFERRED:
+                self.PENDING.append(idx)
+            priority = self.MAX_PRIORITY
+        else:
+            priority = self.get_priority(td_error)
 
-        for i in range(batch_size):
-            l = segment * i
-            r = segment * (i+1)
+        self.prioritise(idx, priority)
+        self.BETA = min(self.BETA + self.BETA_ANNEALER, 1.0)
+        return idx
 
-            s = random.uniform(l, r)
-            (idx, priority, data) = self.TREE.get(s)
+    def pending(self):
+        indices = np.unique(np.array(self.PENDING, dtype=np.int64))
+        self.PENDING = []
+        return self.gather(indices), indices
+
+    def sample(self, batch_size):
+        segment = self.TREE.total_sum() / batch_size
+        s = (np.arange(batch_size) + np.random.uniform(size=batch_size)) * segment
 
-            batch.append(data)
-            indices.append(idx)
-            priorities.append(priority)
+        indices = np.minimum(self.TREE.get(s), self.current_length() - 1)
+        weights = (self.TREE.leaf(indices) / self.MIN_TREE.min()) ** -self.BETA
 
-        samples = map(np.array, zip(*batch))
-        return samples, indices, priorities
+        return self.gather(indices), indices, weights.astype(np.float32)
 
     def update(self, idx, td_error):
-        if isinstance(idx, list):
-            for i in range(len(idx)):
-                priority = self.get_priority(td_error[i])
-                self.TREE.update(idx[i], priority)
-        else:
-            priority = self.get_priority(td_error)
-            self.TREE.update(idx, priority)
+        priority = self.get_priority(np.asarray(td_error))
+        self.MAX_PRIORITY = max(self.MAX_PRIORITY, float(np.max(priority)))
+
+        if self.FRAMES:
+            priority = np.where(self.valid_history[idx], priority, 0.0)
+        self.prioritise(idx, priority)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import os
+import numpy as np
+import tensorflow as tf
+
+from trajectory import load_shard
+
+def read_shard(path):
+    shard = load_shard(path.decode())
+    starts = np.maximum.accumulate(np.where(shard['starts'], np.arange(len(shard['starts'])), 0))
+    return (np.asarray(shard['frames']), np.asarray(shard['actions']), np.asarray(shard['rewards']),
+            np.asarray(shard['terminals'], dtype=np.float32), starts.astype(np.int64))
+
+class OfflineMemory:
+    def __init__(self, config, directory):
+        self.BATCH_SIZE = config['batch_size']
+        self.WINDOW_LENGTH = config['window_length']
+        self.INPUT_SHAPE = config['input_shape']
+        self.SHUFFLE = config['offline_shuffle']
+        self.PATHS = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.startswith('shard_') and f.endswith('.npz'))
+
+        self.DATASET = self.dataset()
+        self.ITERATOR = iter(self.DATASET)
+
+    def transitions(self, path):
+        dtypes = [tf.uint8, tf.int32, tf.float32, tf.float32, tf.int64]
+        frames, actions, rewards, terminals, starts = tf.numpy_function(read_shard, [path], dtypes)
+        frames.set_shape([None, self.INPUT_SHAPE[0], self.INPUT_SHAPE[1]])
+
+        offsets = tf.range(self.WINDOW_LENGTH, dtype=tf.int64)
+        indices = tf.where(tf.range(tf.size(starts, out_type=tf.int64)) > starts)[:, 0]
+
+        def window(i):
+            state = tf.gather(frames, tf.maximum(i - 1 - offsets, starts[i]))
+            state_next = tf.gather(frames, tf.maximum(i - offsets, starts[i]))
+            return actions[i], tf.transpose(state, [1, 2, 0]), tf.transpose(state_next, [1, 2, 0]), rewards[i], terminals[i]
+
+        return tf.data.Dataset.from_tensor_slices(indices).map(window)
+
+    def decode(self, action, state, state_next, reward, terminal):
+        return action, tf.cast(state, tf.float32) / 255.0, tf.cast(state_next, tf.float32) / 255.0, reward, terminal
+
+    def dataset(self):
+        paths = tf.data.Dataset.from_tensor_slices(self.PATHS).shuffle(len(self.PATHS)).repeat()
+        dataset = paths.interleave(self.transitions, cycle_length=min(4, len(self.PATHS)), num_parallel_calls=tf.data.AUTOTUNE, deterministic=False)
+        dataset = dataset.shuffle(self.SHUFFLE).batch(self.BATCH_SIZE, drop_remainder=True)
+        return dataset.map(self.decode, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+    def sample(self):
+        return next(self.ITERATOR)
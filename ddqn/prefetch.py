@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import queue, threading
+import numpy as np
+import tensorflow as tf
+
+class Prefetcher:
+    def __init__(self, memory, depth, *args):
+        self.MEMORY = memory
+        self.ARGS = args
+        self.LOCK = threading.Lock()
+
+        self.BATCHES = queue.Queue(maxsize=depth)
+        self.UPDATES = queue.Queue()
+
+        self.RUNNING = False
+        self.ERROR = None
+        self.THREAD = threading.Thread(target=self.worker, daemon=True)
+
+    def __getattr__(self, name):
+        return getattr(self.MEMORY, name)
+
+    def worker(self):
+        try:
+            while self.RUNNING:
+                with self.LOCK:
+                    self.apply_updates()
+                    batch = self.MEMORY.sample(*self.ARGS)
+
+                batch = tf.nest.map_structure(tf.convert_to_tensor, batch)
+                while self.RUNNING:
+                    try:
+                        self.BATCHES.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+        except Exception as e:
+            self.ERROR = e
+
+    def apply_updates(self):
+        while True:
+            try:
+                idx, td_error = self.UPDATES.get_nowait()
+            except queue.Empty:
+                return
+            self.MEMORY.update(idx, td_error)
+
+    def start(self):
+        if not self.RUNNING:
+            self.RUNNING = True
+            self.THREAD.start()
+
+    def close(self):
+        self.RUNNING = False
+        if self.THREAD.is_alive():
+            self.THREAD.join()
+
+    def push(self, *args, **kwargs):
+        with self.LOCK:
+            return self.MEMORY.push(*args, **kwargs)
+
+    def pending(self):
+        with self.LOCK:
+            return self.MEMORY.pending()
+
+    def sync(self, *args, **kwargs):
+        with self.LOCK:
+            return self.MEMORY.sync(*args, **kwargs)
+
+    def sample(self, *args):
+        self.start()
+        while True:
+            try:
+                return self.BATCHES.get(timeout=0.1)
+            except queue.Empty:
+                if self.ERROR is not None:
+                    raise self.ERROR
+                if not self.THREAD.is_alive():
+                    raise RuntimeError("Prefetch worker stopped")
+
+    def update(self, idx, td_error):
+        self.UPDATES.put((np.asarray(idx), np.asarray(td_error)))
@@ -2,60 +2,52 @@
 
 import numpy as np
 
-class SumTree:
-    def __init__(self, capacity):
-        self.FULL = False
-        self.WRITE_INDEX = 0
+class SegmentTree:
+    def __init__(self, capacity, operation, neutral):
         self.CAPACITY = capacity
-        self.TREE = np.zeros(2 * capacity - 1)
-        self.DATA = np.zeros(capacity, dtype=object)
-
-    def propagate(self, idx, change):
-        parent = (idx - 1) // 2
-        self.TREE[parent] += change
+        self.OPERATION = operation
+        self.DEPTH = int(np.ceil(np.log2(capacity))) if capacity > 1 else 0
+        self.LEAVES = 2 ** self.DEPTH
+        self.TREE = np.full(2 * self.LEAVES - 1, neutral, dtype=np.float64)
 
-        if parent != 0:
-            self.propagate(parent, change)
+    def propagate(self, idx):
+        for _ in range(self.DEPTH):
+            idx = (idx - 1) // 2
+            self.TREE[idx] = self.OPERATION(self.TREE[2 * idx + 1], self.TREE[2 * idx + 2])
 
-    def retrieve(self, idx, s):
-        left = 2 * idx + 1
-        right = left + 1
+    def leaf(self, idx):
+        return self.TREE[np.asarray(idx) + self.LEAVES - 1]
 
-        if left >= len(self.TREE):
-            return idx
+    def update(self, idx, priority):
+        idx = np.atleast_1d(np.asarray(idx, dtype=np.int64)) + self.LEAVES - 1
 
-        if s <= self.TREE[left]:
-            return self.retrieve(left, s)
-        else:
-            return self.retrieve(right, s - self.TREE[left])
+        self.TREE[idx] = np.reshape(priority, -1)
+        self.propagate(idx)
 
-    def current_length(self):
-        if self.FULL:
-            return self.CAPACITY
-        else:
-            return self.WRITE_INDEX
+class SumTree(SegmentTree):
+    def __init__(self, capacity):
+        super().__init__(capacity, np.add, 0.0)
+
+    def retrieve(self, s):
+        idx = np.zeros(len(s), dtype=np.int64)
+        for _ in range(self.DEPTH):
+            left = 2 * idx + 1
+            value = self.TREE[left]
+            right = s > value
+            s = s - value * right
+            idx = left + right
+        return idx
 
     def total_sum(self):
         return self.TREE[0]
 
-    def insert(self, data, priority):
-        self.DATA[self.WRITE_INDEX] = data
-
-        idx = self.WRITE_INDEX + self.CAPACITY - 1
-        self.update(idx, priority)
-
-        self.WRITE_INDEX += 1
-        if self.WRITE_INDEX >= self.CAPACITY:
-            self.WRITE_INDEX = 0
-            self.FULL = True
-
-    def update(self, idx, priority):
-        change = priority - self.TREE[idx]
+    def get(self, s):
+        idx = self.retrieve(np.atleast_1d(np.asarray(s, dtype=np.float64)))
+        return np.minimum(idx - self.LEAVES + 1, self.CAPACITY - 1)
 
-        self.TREE[idx] = priority
-        self.propagate(idx, change)
+class MinTree(SegmentTree):
+    def __init__(self, capacity):
+        super().__init__(capacity, np.minimum, np.inf)
 
-    def get(self, s):
-        idx = self.retrieve(0, s)
-        data_idx = idx - self.CAPACITY + 1
-        return (idx, self.TREE[idx], self.DATA[data_idx])
+    def min(self):
+        return self.TREE[0]
@@ -108,13 +108,11 @@ def plot_value(values, counter, depth):
     return frame
 
 def view_depth(env):
-    state = env.get_state()
-    depth = state.depth_buffer
+    depth = sandbox.game_state(env).depth_buffer
     return depth
 
 def view_automap(env):
-    state = env.get_state()
-    automap = state.automap_buffer
+    automap = sandbox.game_state(env).automap_buffer
     automap = np.rollaxis(automap, 0, 3)
     return automap
 
@@ -134,7 +132,7 @@ def color_labels(labels):
     return constant
 
 def view_class():
-    state = env.get_state()
+    state = sandbox.game_state(env)
     labels = state.labels_buffer
     if labels is not None:
         seg = color_labels(labels)
@@ -207,7 +205,7 @@ def witness(env, action_space, model):
 
 sandbox = Sandbox(config)
 
-env, action_space = sandbox.build_env(config['env_name'], True)
+env, action_space = sandbox.build_env(config['env_name'], True, profile='human')
 terminal, state, info = sandbox.reset(env)
 
 agent = DQNAgent(config, sandbox, env, action_space)
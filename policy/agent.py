@@ -2,85 +2,99 @@
 
 import random
 import numpy as np
-import tensorflow as tf
 
-from utils import capture, render_gif
+from returns import discount
+from rollout import RolloutBuffer
+from utils import capture, render_gif, infer
 
 class PolicyAgent:
     def __init__(self, config, sandbox, env, action_space):
         self.SANDBOX = sandbox
         self.ENV = env
+        self.ENV_NAME = config['env_name']
+        self.EVAL_ENV = None
+        self.RECORDER = None
         self.ACTION_SPACE = action_space
 
         self.GAMMA = config['gamma']
         self.STATE_SIZE = (config['window_length'], config['input_shape'][0], config['input_shape'][1])
+        self.ROLLOUT_LENGTH = config['rollout_length']
+        self.ROLLOUT_DTYPE = np.uint8 if config['rollout_uint8'] else np.float32
 
-        self.action_history, self.state_history, self.reward_history = [], [], []
+        self.BUFFER = self.rollout_buffer()
+
+    def rollout_buffer(self, n_envs=1):
+        state_shape = (self.STATE_SIZE[1], self.STATE_SIZE[2], self.STATE_SIZE[0])
+        return RolloutBuffer(self.ROLLOUT_LENGTH, n_envs, state_shape, self.ROLLOUT_DTYPE)
 
     def act(self, state, model):
-        state_tensor = tf.convert_to_tensor(state)
-        state_tensor = tf.expand_dims(state_tensor, 0)
-        policy = model.predict(state_tensor)[0]
-        action = np.random.choice(self.ACTION_SPACE, p=policy)
-        return action
-
-    def push(self, state, action_idx, reward):
-        action = np.zeros([self.ACTION_SPACE])
-        action[action_idx] = 1
-
-        self.action_history.append(action)
-        self.state_history.append(np.expand_dims(state, axis=0))
-        self.reward_history.append(reward)
-
-    def discount_rewards(self):
-        sum_reward = 0
-        discounted_r = np.zeros_like(self.reward_history)
-        for i in reversed(range(0,len(self.reward_history))):
-            if self.reward_history[i] != 0:
-                sum_reward = 0
-            sum_reward = sum_reward * self.GAMMA + self.reward_history[i]
-            discounted_r[i] = sum_reward
+        return infer(model, state, sample=True)
+
+    def push(self, state, action_idx, reward, terminal=False):
+        self.BUFFER.push(state, action_idx, reward, terminal)
+
+    def discount_rewards(self, buffer, bootstrap=None):
+        rewards, dones = buffer.REWARDS[:len(buffer)], buffer.DONES[:len(buffer)]
+        discounted_r = discount(rewards, self.GAMMA, dones, reset_on_reward=True, bootstrap=bootstrap).reshape(-1)
 
         discounted_r -= np.mean(discounted_r)
-        discounted_r /= np.std(discounted_r)
+        discounted_r /= np.std(discounted_r) + 1e-8
         return discounted_r
 
+    def bootstrap(self, critic, buffer, state_next):
+        if buffer.DONES[len(buffer) - 1].all():
+            return None
+        state_next = np.reshape(state_next, (buffer.N_ENVS,) + buffer.STATES.shape[2:])
+        return critic.predict(state_next)[:, 0]
+
     def learn_policy(self, model):
-        actions = np.vstack(self.action_history)
-        states = np.vstack(self.state_history)
+        states = self.BUFFER.observations()
+        actions = self.BUFFER.one_hot(self.ACTION_SPACE)
 
-        discounted_r = self.discount_rewards()
+        discounted_r = self.discount_rewards(self.BUFFER)
 
         history = model.fit(states, actions, sample_weight=discounted_r, epochs=1, verbose=0)
 
-        self.action_history, self.state_history, self.reward_history = [], [], []
+        self.BUFFER.reset()
         return history.history['loss'][0]
 
-    def learn_a2c(self, actor, critic):
-        states = np.vstack(self.state_history)
-        actions = np.vstack(self.action_history)
+    def learn_a2c(self, actor, critic, state_next):
+        states = self.BUFFER.observations()
+        actions = self.BUFFER.one_hot(self.ACTION_SPACE)
 
-        values = critic.predict(states)[:, 0]
-        discounted_r = self.discount_rewards()
+        values = self.BUFFER.flatten(self.BUFFER.VALUES)
+        values[:] = critic.predict(states)[:, 0]
+        discounted_r = self.discount_rewards(self.BUFFER, self.bootstrap(critic, self.BUFFER, state_next))
         advantages = discounted_r - values
 
         actor_history = actor.fit(states, actions, sample_weight=advantages, epochs=1, verbose=0)
         critic_history = critic.fit(states, discounted_r, epochs=1, verbose=0)
 
-        self.action_history, self.state_history, self.reward_history = [], [], []
+        self.BUFFER.reset()
         return actor_history.history['loss'][0], critic_history.history['loss'][0]
 
+    def evaluation_env(self):
+        if self.EVAL_ENV is None:
+            self.EVAL_ENV, _ = self.SANDBOX.build_env(self.ENV_NAME, profile='human')
+        return self.EVAL_ENV
+
     def evaluate(self, model, log_dir, episode_id):
-        terminal, state, info = self.SANDBOX.reset(self.ENV)
+        env = self.evaluation_env()
+        terminal, state, info = self.SANDBOX.reset(env)
         prev_info = info
 
+        if self.RECORDER:
+            self.RECORDER.record(state, info=info, start=True)
+
         frames = []
         episode_reward = 0
 
         while not terminal:
-            frames = capture(self.ENV, self.SANDBOX, frames)
+            frames = capture(env, self.SANDBOX, frames)
             action = self.act(state, model)
-            state_next, reward, terminal, info = self.SANDBOX.step(self.ENV, action, prev_info)
+            state_next, reward, terminal, info = self.SANDBOX.step(env, action, prev_info)
+            if self.RECORDER:
+                self.RECORDER.record(state_next, action, reward, terminal, info)
 
             prev_info = info
             episode_reward += reward
@@ -99,91 +113,100 @@ class AsynchronousAgent:
     def __init__(self, config, sandbox, env, action_space):
         self.SANDBOX = sandbox
         self.ENV = env
+        self.ENV_NAME = config['env_name']
+        self.EVAL_ENV = None
+        self.RECORDER = None
         self.ACTION_SPACE = action_space
 
         self.GAMMA = config['gamma']
         self.STATE_SIZE = (config['window_length'], config['input_shape'][0], config['input_shape'][1])
+        self.ROLLOUT_LENGTH = config['rollout_length']
+        self.ROLLOUT_DTYPE = np.uint8 if config['rollout_uint8'] else np.float32
+
+    def rollout_buffer(self, n_envs=1):
+        state_shape = (self.STATE_SIZE[1], self.STATE_SIZE[2], self.STATE_SIZE[0])
+        return RolloutBuffer(self.ROLLOUT_LENGTH, n_envs, state_shape, self.ROLLOUT_DTYPE)
 
     def act(self, state, model):
-        state_tensor = tf.convert_to_tensor(state)
-        state_tensor = tf.expand_dims(state_tensor, 0)
-        policy = model.predict(state_tensor)[0]
-        action = np.random.choice(self.ACTION_SPACE, p=policy)
-        return action
+        return infer(model, state, sample=True)
 
     def policy_act(self, state, model):
-        state_tensor = tf.convert_to_tensor(state)
-        state_tensor = tf.expand_dims(state_tensor, 0)
-        policy = model.predict(state_tensor)[0]
-        action = np.random.choice(self.ACTION_SPACE, p=policy)
-        return action, policy
-
-    def push(self, state, action_idx, reward):
-        action = np.zeros([self.ACTION_SPACE])
-        action[action_idx] = 1
-
-        self.action_history.append(action)
-        self.state_history.append(np.expand_dims(state, axis=0))
-        self.reward_history.append(reward)
-
-    def discount_rewards(self, reward):
-        sum_reward = 0
-        discounted_r = np.zeros_like(reward)
-        for i in reversed(range(0,len(reward))):
-            if reward[i] != 0:
-                sum_reward = 0
-            sum_reward = sum_reward * self.GAMMA + reward[i]
-            discounted_r[i] = sum_reward
+        return infer(model, state, sample=True, output=True)
+
+    def discount_rewards(self, buffer, bootstrap=None):
+        rewards, dones = buffer.REWARDS[:len(buffer)], buffer.DONES[:len(buffer)]
+        discounted_r = discount(rewards, self.GAMMA, dones, reset_on_reward=True, bootstrap=bootstrap).reshape(-1)
 
         discounted_r -= np.mean(discounted_r)
-        discounted_r /= np.std(discounted_r)
+        discounted_r /= np.std(discounted_r) + 1e-8
         return discounted_r
 
-    def learn_a3c(self, actor, critic, actions, states, rewards):
-        actions = np.vstack(actions)
-        states = np.vstack(states)
+    def bootstrap(self, critic, buffer, state_next):
+        if buffer.DONES[len(buffer) - 1].all():
+            return None
+        state_next = np.reshape(state_next, (buffer.N_ENVS,) + buffer.STATES.shape[2:])
+        return critic.predict(state_next)[:, 0]
+
+    def learn_a3c(self, actor, critic, buffer, state_next):
+        states = buffer.observations()
+        actions = buffer.one_hot(self.ACTION_SPACE)
 
-        values = critic.predict(states)[:, 0]
-        discounted_r = self.discount_rewards(rewards)
+        values = buffer.flatten(buffer.VALUES)
+        values[:] = critic.predict(states)[:, 0]
+        discounted_r = self.discount_rewards(buffer, self.bootstrap(critic, buffer, state_next))
         advantages = discounted_r - values
 
         actor_history = actor.fit(states, actions, sample_weight=advantages, epochs=1, verbose=0)
         critic_history = critic.fit(states, discounted_r, epochs=1, verbose=0)
 
+        buffer.reset()
         a_loss = actor_history.history['loss'][0]
         c_loss = critic_history.history['loss'][0]
         return a_loss, c_loss
 
-    def learn_ppo(self, actor, critic, actions, states, rewards, predictions):
-        actions = np.vstack(actions)
-        states = np.vstack(states)
-        predictions = np.vstack(predictions)
+    def learn_ppo(self, actor, critic, buffer, state_next):
+        states = buffer.observations()
+        actions = buffer.one_hot(self.ACTION_SPACE)
+        predictions = actions * np.exp(buffer.flatten(buffer.LOG_PROBS))[:, np.newaxis]
 
-        discounted_r = np.vstack(self.discount_rewards(rewards))
+        discounted_r = self.discount_rewards(buffer, self.bootstrap(critic, buffer, state_next))[:, np.newaxis]
 
-        values = critic.predict(states)
-        advantages = discounted_r - values
+        values = buffer.flatten(buffer.VALUES)
+        values[:] = critic.predict(states)[:, 0]
+        advantages = discounted_r - values[:, np.newaxis]
 
         y_true = np.hstack([advantages, predictions, actions])
 
-        actor_history = actor.fit(states, y_true, epochs=10, shuffle=True, batch_size=len(rewards), verbose=0)
-        critic_history = critic.fit(states, discounted_r, epochs=10, shuffle=True, batch_size=len(rewards), verbose=0)
+        actor_history = actor.fit(states, y_true, epochs=10, shuffle=True, batch_size=len(states), verbose=0)
+        critic_history = critic.fit(states, discounted_r, epochs=10, shuffle=True, batch_size=len(states), verbose=0)
 
+        buffer.reset()
         a_loss = actor_history.history['loss'][0]
         c_loss = critic_history.history['loss'][0]
         return a_loss, c_loss
 
+    def evaluation_env(self):
+        if self.EVAL_ENV is None:
+            self.EVAL_ENV, _ = self.SANDBOX.build_env(self.ENV_NAME, profile='human')
+        return self.EVAL_ENV
+
     def evaluate(self, model, log_dir, episode_id):
-        terminal, state, info = self.SANDBOX.reset(self.ENV)
+        env = self.evaluation_env()
+        terminal, state, info = self.SANDBOX.reset(env)
         prev_info = info
 
+        if self.RECORDER:
+            self.RECORDER.record(state, info=info, start=True)
+
         frames = []
         episode_reward = 0
 
         while not terminal:
-            frames = capture(self.ENV, self.SANDBOX, frames)
+            frames = capture(env, self.SANDBOX, frames)
             action = self.act(state, model)
-            state_next, reward, terminal, info = self.SANDBOX.step(self.ENV, action, prev_info)
+            state_next, reward, terminal, info = self.SANDBOX.step(env, action, prev_info)
+            if self.RECORDER:
+                self.RECORDER.record(state_next, action, reward, terminal, info)
 
             prev_info = info
             episode_reward += reward
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('..')
+
+import time
+import numpy as np
+import tensorflow as tf
+
+from networks import policy_gradient, actor_critic
+from returns import discount, gae
+from utils import infer
+
+# -----------------------------
+
+def timeit(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+def action_benchmark(input_shape=(84, 84), window_length=4, action_space=3, lr=0.000025, repeats=200):
+    models = {
+        'policy_gradient': policy_gradient(input_shape, window_length, action_space, lr),
+        'actor_critic': actor_critic(input_shape, window_length, action_space, lr)[0]}
+
+    state = np.random.rand(input_shape[0], input_shape[1], window_length).astype(np.float32)
+
+    for name, model in models.items():
+        def predict_step():
+            policy = model.predict(tf.expand_dims(state, 0), verbose=0)[0]
+            return np.random.choice(action_space, p=policy / np.sum(policy))
+
+        def compiled_step():
+            return infer(model, state, sample=True)
+
+        predict_step()
+        compiled_step()
+        print("{}: Action latency, Predict: {:.3f} ms, Compiled: {:.3f} ms".format(name, timeit(predict_step, repeats), timeit(compiled_step, repeats)))
+
+def loop_discount(rewards, gamma):
+    sum_reward = 0
+    discounted_r = np.zeros(len(rewards))
+    for i in reversed(range(0, len(rewards))):
+        if rewards[i] != 0:
+            sum_reward = 0
+        sum_reward = sum_reward * gamma + rewards[i]
+        discounted_r[i] = sum_reward
+    return discounted_r
+
+def loop_bootstrap(rewards, dones, bootstrap, gamma):
+    sum_reward = bootstrap.copy()
+    discounted_r = np.zeros(rewards.shape)
+    for i in reversed(range(0, len(rewards))):
+        sum_reward = rewards[i] + gamma * sum_reward * (1.0 - dones[i])
+        discounted_r[i] = sum_reward
+    return discounted_r
+
+def loop_gae(rewards, values, dones, bootstrap, gamma, lam):
+    advantage = np.zeros(rewards.shape[1:])
+    next_value = bootstrap
+    advantages = np.zeros(rewards.shape)
+    for i in reversed(range(0, len(rewards))):
+        mask = 1.0 - dones[i]
+        delta = rewards[i] + gamma * next_value * mask - values[i]
+        advantage = delta + gamma * lam * mask * advantage
+        advantages[i] = advantage
+        next_value = values[i]
+    return advantages, advantages + values
+
+def returns_test(length=1000, n_envs=8, gamma=0.99, lam=0.95):
+    rewards = np.random.randn(length, n_envs)
+    values = np.random.randn(length, n_envs)
+    dones = np.random.rand(length, n_envs) < 0.05
+    bootstrap = np.random.randn(n_envs)
+
+    assert np.allclose(loop_bootstrap(rewards, dones, bootstrap, gamma), discount(rewards, gamma, dones, bootstrap=bootstrap))
+    for expected, actual in zip(loop_gae(rewards, values, dones, bootstrap, gamma, lam), gae(rewards, values, gamma, lam, dones, bootstrap)):
+        assert np.allclose(expected, actual)
+
+def returns_benchmark(lengths=(1000, 10000, 100000), gamma=0.99, repeats=20):
+    for length in lengths:
+        rewards = np.random.choice([0.0, 0.0, 0.0, 1.0, -1.0], size=length)
+        assert np.allclose(loop_discount(rewards, gamma), discount(rewards, gamma, reset_on_reward=True))
+
+        print("Returns, Length: {}, Loop: {:.3f} ms, Scan: {:.3f} ms".format(length,
+            timeit(lambda: loop_discount(rewards, gamma), repeats), timeit(lambda: discount(rewards, gamma, reset_on_reward=True), repeats)))
+
+# -----------------------------
+
+action_benchmark()
+returns_test()
+returns_benchmark()
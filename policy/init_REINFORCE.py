@@ -10,6 +10,7 @@ from wrappers.gym_atari import Sandbox
 from agent import PolicyAgent
 from networks import policy_gradient
 from utils import load_config, log_feedback
+from trajectory import TrajectoryRecorder
 
 # -----------------------------
 
@@ -38,6 +39,10 @@ agent = PolicyAgent(config, sandbox, env, action_space)
 timestamp, summary_writer = log_feedback(log_dir)
 print("Job ID:", timestamp)
 
+if config['record']:
+    recorder = TrajectoryRecorder(log_dir + timestamp + '/trajectories/train', config['record_shard_size'], config['record_compress'])
+    agent.RECORDER = TrajectoryRecorder(log_dir + timestamp + '/trajectories/evaluate', config['record_shard_size'], config['record_compress'])
+
 frame_count = 0
 episode_count = 0
 
@@ -57,14 +62,20 @@ print("Training...")
 terminal, state, info = sandbox.reset(env)
 prev_info = info
 
+if config['record']:
+    recorder.record(state, info=info, start=True)
+
 while True:
     action = agent.act(state, model)
     state_next, reward, terminal, info = sandbox.step(env, action, prev_info)
-    agent.push(state, action, reward)
+    if config['record']:
+        recorder.record(state_next, action, reward, terminal, info)
+    agent.push(state, action, reward, terminal)
 
-    if terminal:
+    if terminal or agent.BUFFER.full():
         loss = agent.learn_policy(model)
 
+    if terminal:
         episode_reward = 0
         episode_count += 1
 
@@ -103,4 +114,8 @@ while True:
 
     frame_count += 1
 
+if config['record']:
+    recorder.close()
+    agent.RECORDER.close()
+
 env.close()
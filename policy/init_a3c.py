@@ -10,6 +10,7 @@ from wrappers.doom import Sandbox
 from agent import AsynchronousAgent
 from networks import actor_critic
 from utils import load_config, log_feedback
+from trajectory import TrajectoryRecorder
 
 # -----------------------------
 
@@ -41,6 +42,10 @@ def execute():
     timestamp, summary_writer = log_feedback(log_dir)
     print("Job ID:", timestamp)
 
+    if config['record']:
+        recorder = TrajectoryRecorder(log_dir + timestamp + '/trajectories/train', config['record_shard_size'], config['record_compress'])
+        agent.RECORDER = TrajectoryRecorder(log_dir + timestamp + '/trajectories/evaluate', config['record_shard_size'], config['record_compress'])
+
     frame_count = 0
     episode_count = 0
 
@@ -60,20 +65,22 @@ def execute():
     terminal, state, info, image_memory = sandbox.async_reset(env)
     prev_info = info
 
-    actions, states, rewards = [], [], []
+    if config['record']:
+        recorder.record(state, info=info, start=True)
+
+    buffer = agent.rollout_buffer()
 
     while True:
         action = agent.act(state, actor)
         state_next, reward, terminal, info = sandbox.async_step(env, action, prev_info, image_memory)
-        actions.append(sandbox.one_hot(env, action))
-        states.append(tf.expand_dims(state_next, 0))
-        rewards.append(reward)
+        if config['record']:
+            recorder.record(state_next, action, reward, terminal, info)
+        buffer.push(state, action, reward, terminal)
 
-        if terminal:
-            a_loss, c_loss = agent.learn_a3c(actor, critic, actions, states, rewards)
-
-            actions, states, rewards = [], [], []
+        if terminal or buffer.full():
+            a_loss, c_loss = agent.learn_a3c(actor, critic, buffer, state_next)
 
+        if terminal:
             episode_reward = 0
             episode_count += 1
 
@@ -113,6 +120,10 @@ def execute():
 
         frame_count += 1
 
+    if config['record']:
+        recorder.close()
+        agent.RECORDER.close()
+
     env.close()
 
 # -----------------------------
@@ -156,22 +167,19 @@ def train_threading(env, thread):
     terminal, state, info, image_memory = sandbox.async_reset(env)
     prev_info = info
 
-    actions, states, rewards = [], [], []
+    buffer = agent.rollout_buffer()
 
     while True:
         action = agent.act(state, actor)
         state_next, reward, terminal, info = sandbox.async_step(env, action, prev_info, image_memory)
-        actions.append(sandbox.one_hot(env, action))
-        states.append(tf.expand_dims(state_next, 0))
-        rewards.append(reward)
+        buffer.push(state, action, reward, terminal)
 
-        if terminal:
+        if terminal or buffer.full():
             lock.acquire()
-            a_loss, c_loss = agent.learn_a3c(actor, critic, actions, states, rewards)
+            a_loss, c_loss = agent.learn_a3c(actor, critic, buffer, state_next)
             lock.release()
 
-            actions, states, rewards = [], [], []
-
+        if terminal:
             episode_reward = 0
             episode_count += 1
 
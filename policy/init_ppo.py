@@ -10,6 +10,7 @@ from wrappers.doom import Sandbox
 from agent import AsynchronousAgent
 from networks import actor_critic_ppo
 from utils import load_config, log_feedback
+from trajectory import TrajectoryRecorder
 
 # -----------------------------
 
@@ -41,6 +42,10 @@ def execute():
     timestamp, summary_writer = log_feedback(log_dir)
     print("Job ID:", timestamp)
 
+    if config['record']:
+        recorder = TrajectoryRecorder(log_dir + timestamp + '/trajectories/train', config['record_shard_size'], config['record_compress'])
+        agent.RECORDER = TrajectoryRecorder(log_dir + timestamp + '/trajectories/evaluate', config['record_shard_size'], config['record_compress'])
+
     frame_count = 0
     episode_count = 0
 
@@ -60,21 +65,22 @@ def execute():
     terminal, state, info, image_memory = sandbox.async_reset(env)
     prev_info = info
 
-    actions, states, rewards, predictions = [], [], [], []
+    if config['record']:
+        recorder.record(state, info=info, start=True)
+
+    buffer = agent.rollout_buffer()
 
     while True:
         action, prediction = agent.policy_act(state, actor)
         state_next, reward, terminal, info = sandbox.async_step(env, action, prev_info, image_memory)
-        actions.append(sandbox.one_hot(env, action))
-        states.append(tf.expand_dims(state_next, 0))
-        rewards.append(reward)
-        predictions.append(prediction)
+        if config['record']:
+            recorder.record(state_next, action, reward, terminal, info)
+        buffer.push(state, action, reward, terminal, log_prob=np.log(prediction[action] + 1e-10))
 
-        if terminal:
-            a_loss, c_loss = agent.learn_ppo(actor, critic, actions, states, rewards, predictions)
-
-            actions, states, rewards, predictions = [], [], [], []
+        if terminal or buffer.full():
+            a_loss, c_loss = agent.learn_ppo(actor, critic, buffer, state_next)
 
+        if terminal:
             episode_reward = 0
             episode_count += 1
 
@@ -114,6 +120,10 @@ def execute():
 
         frame_count += 1
 
+    if config['record']:
+        recorder.close()
+        agent.RECORDER.close()
+
     env.close()
 
 # -----------------------------
@@ -157,23 +167,19 @@ def train_threading(env, thread):
     terminal, state, info, image_memory = sandbox.async_reset(env)
     prev_info = info
 
-    actions, states, rewards, predictions = [], [], [], []
+    buffer = agent.rollout_buffer()
 
     while True:
         action, prediction = agent.policy_act(state, actor)
         state_next, reward, terminal, info = sandbox.async_step(env, action, prev_info, image_memory)
-        actions.append(sandbox.one_hot(env, action))
-        states.append(tf.expand_dims(state_next, 0))
-        rewards.append(reward)
-        predictions.append(prediction)
+        buffer.push(state, action, reward, terminal, log_prob=np.log(prediction[action] + 1e-10))
 
-        if terminal:
+        if terminal or buffer.full():
             lock.acquire()
-            a_loss, c_loss = agent.learn_ppo(actor, critic, actions, states, rewards, predictions)
+            a_loss, c_loss = agent.learn_ppo(actor, critic, buffer, state_next)
             lock.release()
 
-            actions, states, rewards, prediction = [], [], [], []
-
+        if terminal:
             episode_reward = 0
             episode_count += 1
 
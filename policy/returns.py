@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+def scan(a, b):
+    # Solves x_t = a_t * x_{t+1} + b_t backwards along axis 0 with a Hillis-Steele doubling scan
+    a = np.array(a[::-1], dtype=np.float64)
+    b = np.array(b[::-1], dtype=np.float64)
+
+    offset = 1
+    while offset < len(b):
+        b[offset:] = b[offset:] + a[offset:] * b[:-offset]
+        a[offset:] = a[offset:] * a[:-offset]
+        offset *= 2
+    return b[::-1]
+
+def continuation(gamma, rewards, dones=None, reset_on_reward=False):
+    a = np.full(rewards.shape, gamma, dtype=np.float64)
+    if dones is not None:
+        a *= 1.0 - np.asarray(dones, dtype=np.float64)
+    if reset_on_reward:
+        a *= rewards == 0
+    return a
+
+def discount(rewards, gamma, dones=None, reset_on_reward=False, bootstrap=None):
+    rewards = np.asarray(rewards, dtype=np.float64)
+    a = continuation(gamma, rewards, dones, reset_on_reward)
+
+    b = rewards.copy()
+    if bootstrap is not None:
+        b[-1] += a[-1] * np.asarray(bootstrap, dtype=np.float64)
+    return scan(a, b)
+
+def gae(rewards, values, gamma, lam, dones=None, bootstrap=None):
+    rewards = np.asarray(rewards, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    a = continuation(gamma, rewards, dones)
+
+    next_values = np.zeros_like(values)
+    next_values[:-1] = values[1:]
+    if bootstrap is not None:
+        next_values[-1] = bootstrap
+
+    deltas = rewards + a * next_values - values
+    advantages = scan(a * lam, deltas)
+    return advantages, advantages + values
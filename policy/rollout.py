@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+class RolloutBuffer:
+    def __init__(self, capacity, n_envs, state_shape, dtype=np.float32):
+        self.CAPACITY = capacity
+        self.N_ENVS = n_envs
+        self.DTYPE = np.dtype(dtype)
+
+        self.STATES = np.zeros((capacity, n_envs) + tuple(state_shape), dtype=self.DTYPE)
+        self.ACTIONS = np.zeros((capacity, n_envs), dtype=np.int32)
+        self.REWARDS = np.zeros((capacity, n_envs), dtype=np.float32)
+        self.DONES = np.zeros((capacity, n_envs), dtype=bool)
+        self.VALUES = np.zeros((capacity, n_envs), dtype=np.float32)
+        self.LOG_PROBS = np.zeros((capacity, n_envs), dtype=np.float32)
+        self.INDEX = 0
+
+    def __len__(self):
+        return self.INDEX
+
+    def full(self):
+        return self.INDEX == self.CAPACITY
+
+    def push(self, state, action, reward, done, value=0.0, log_prob=0.0):
+        i = self.INDEX
+        if self.DTYPE == np.uint8:
+            self.STATES[i] = np.uint8(np.clip(state, 0, 1) * 255 + 0.5)
+        else:
+            self.STATES[i] = state
+        self.ACTIONS[i] = action
+        self.REWARDS[i] = reward
+        self.DONES[i] = done
+        self.VALUES[i] = value
+        self.LOG_PROBS[i] = log_prob
+        self.INDEX += 1
+
+    def flatten(self, array):
+        return array[:self.INDEX].reshape((-1,) + array.shape[2:])
+
+    def observations(self):
+        states = self.flatten(self.STATES)
+        if self.DTYPE == np.uint8:
+            return states.astype(np.float32) / 255.0
+        return states
+
+    def one_hot(self, action_space):
+        return np.eye(action_space, dtype=np.float32)[self.flatten(self.ACTIONS)]
+
+    def reset(self):
+        self.INDEX = 0
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+import os, queue, struct, threading, zipfile
+import numpy as np
+
+FIELDS = ['frames', 'actions', 'rewards', 'terminals', 'variables', 'starts']
+
+def quantize(frame):
+    return np.uint8(np.clip(frame, 0, 1) * 255 + 0.5)
+
+class TrajectoryRecorder:
+    def __init__(self, outdir, shard_size=10000, compress=False):
+        self.OUTDIR = outdir
+        self.SHARD_SIZE = shard_size
+        self.COMPRESS = compress
+
+        os.makedirs(outdir, exist_ok=True)
+        self.SHARD_ID = len([f for f in os.listdir(outdir) if f.startswith('shard_') and f.endswith('.npz')])
+        self.SHARD = None
+        self.INDEX = 0
+        self.START = True
+
+        self.QUEUE = queue.Queue()
+        self.WRITER = threading.Thread(target=self.write, daemon=True)
+        self.WRITER.start()
+
+    def allocate(self, frame_shape, n_variables):
+        return {
+            'frames': np.zeros((self.SHARD_SIZE,) + frame_shape, dtype=np.uint8),
+            'actions': np.zeros(self.SHARD_SIZE, dtype=np.int32),
+            'rewards': np.zeros(self.SHARD_SIZE, dtype=np.float32),
+            'terminals': np.zeros(self.SHARD_SIZE, dtype=bool),
+            'variables': np.zeros((self.SHARD_SIZE, n_variables), dtype=np.float32),
+            'starts': np.zeros(self.SHARD_SIZE, dtype=bool)}
+
+    def record(self, state, action=0, reward=0.0, terminal=False, info=None, start=False):
+        frame = np.asarray(state)[:, :, 0]
+        variables = np.zeros(0) if info is None else np.asarray(info, dtype=np.float32).ravel()
+
+        if self.SHARD is None:
+            self.SHARD = self.allocate(frame.shape, len(variables))
+
+        i = self.INDEX
+        self.SHARD['frames'][i] = quantize(frame)
+        self.SHARD['actions'][i] = action
+        self.SHARD['rewards'][i] = reward
+        self.SHARD['terminals'][i] = terminal
+        self.SHARD['variables'][i] = variables
+        self.SHARD['starts'][i] = start or self.START
+
+        self.START = bool(terminal)
+        self.INDEX += 1
+        if self.INDEX == self.SHARD_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.SHARD is None or self.INDEX == 0:
+            return
+
+        shard = {name: array[:self.INDEX] for name, array in self.SHARD.items()}
+        self.QUEUE.put((os.path.join(self.OUTDIR, 'shard_{:06d}.npz'.format(self.SHARD_ID)), shard))
+        self.SHARD_ID += 1
+        self.SHARD = None
+        self.INDEX = 0
+
+    def write(self):
+        while True:
+            item = self.QUEUE.get()
+            if item is None:
+                break
+
+            path, shard = item
+            save = np.savez_compressed if self.COMPRESS else np.savez
+            with open(path + '.tmp', 'wb') as f:
+                save(f, **shard)
+            os.replace(path + '.tmp', path)
+
+    def close(self):
+        self.flush()
+        self.QUEUE.put(None)
+        self.WRITER.join()
+
+def load_shard(path):
+    shard = {}
+    with zipfile.ZipFile(path) as archive:
+        members = archive.infolist()
+
+    with open(path, 'rb') as f:
+        for member in members:
+            name = member.filename[:-len('.npy')]
+            if member.compress_type != zipfile.ZIP_STORED:
+                with zipfile.ZipFile(path) as archive, archive.open(member) as npy:
+                    shard[name] = np.lib.format.read_array(npy)
+                continue
+
+            # Skip the local file header, whose extra field can differ from the central directory
+            f.seek(member.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(member.header_offset + 30 + name_length + extra_length)
+
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            order = 'F' if fortran else 'C'
+            if np.prod(shape) == 0:
+                shard[name] = np.zeros(shape, dtype=dtype)
+            else:
+                shard[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape, order=order)
+    return shard
+
+class TrajectoryReader:
+    def __init__(self, directory):
+        self.PATHS = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.startswith('shard_') and f.endswith('.npz'))
+        self.SHARDS = [load_shard(path) for path in self.PATHS]
+        self.OFFSETS = np.cumsum([0] + [len(shard['actions']) for shard in self.SHARDS])
+
+    def __len__(self):
+        return int(self.OFFSETS[-1])
+
+    def locate(self, indices):
+        indices = np.asarray(indices)
+        shard_ids = np.searchsorted(self.OFFSETS, indices, side='right') - 1
+        return shard_ids, indices - self.OFFSETS[shard_ids]
+
+    def get(self, name, indices):
+        shard_ids, local = self.locate(indices)
+        out = np.empty((len(shard_ids),) + self.SHARDS[0][name].shape[1:], dtype=self.SHARDS[0][name].dtype)
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            out[mask] = self.SHARDS[shard_id][name][local[mask]]
+        return out
+
+    def __getitem__(self, idx):
+        return {name: self.get(name, [idx])[0] for name in FIELDS}
+
+    def episode_starts(self):
+        starts = np.concatenate([shard['starts'] for shard in self.SHARDS])
+        return np.maximum.accumulate(np.where(starts, np.arange(len(starts)), 0))
@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 
-import yaml, os, datetime, imageio
+import yaml, os, datetime, imageio, threading
 import numpy as np
 
 import tensorflow as tf
 from tensorflow.keras.callbacks import TensorBoard
 
+ACTORS = {}
+ACTORS_LOCK = threading.Lock()
+
 def load_config(file):
     with open(file) as f:
         return yaml.full_load(f)
@@ -19,8 +22,9 @@ def render_gif(frames, filename):
     frames = np.uint8(frames)
     return imageio.mimsave(filename + '.gif', frames)
 
-def log_feedback(log_dir):
-    timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+def log_feedback(log_dir, timestamp=None):
+    if timestamp is None:
+        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
 
     summary_writer = tf.summary.create_file_writer(log_dir + timestamp)
     tensorboard_callback = TensorBoard(log_dir=log_dir, histogram_freq=1)
@@ -28,6 +32,35 @@ def log_feedback(log_dir):
     os.system("tensorboard --logdir=" + str(log_dir) + " --port=6006 &")
     return timestamp, summary_writer
 
+def checkpoint(outdir):
+    names = [f[len('model_'):-len('.h5')] for f in os.listdir(outdir) if f.startswith('model_') and f.endswith('.h5')]
+    episodes = [int(n) for n in names if n.isdigit()]
+    return max(episodes) if episodes else None
+
 def load(outdir, id):
     model = tf.keras.models.load_model(outdir + '/model_' + str(id) + '.h5', compile=False)
     return model
+
+def actor(model, sample=False):
+    key = (id(model), sample)
+    with ACTORS_LOCK:
+        if key not in ACTORS:
+            spec = tf.TensorSpec(model.input_shape[1:], tf.float32)
+
+            @tf.function(input_signature=[spec])
+            def act(state):
+                output = model(state[tf.newaxis], training=False)
+                if sample:
+                    action = tf.random.categorical(tf.math.log(output), 1)[0, 0]
+                else:
+                    action = tf.argmax(output[0])
+                return action, output[0]
+
+            ACTORS[key] = (model, act)
+        return ACTORS[key][1]
+
+def infer(model, state, sample=False, output=False):
+    action, prediction = actor(model, sample)(tf.convert_to_tensor(state, tf.float32))
+    if output:
+        return int(action), prediction.numpy()
+    return int(action)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('..')
+
+import time
+import cv2
+import numpy as np
+
+import skimage
+from skimage import transform, color
+
+from wrappers.preprocess import preprocess_frames
+
+# -----------------------------
+
+def skimage_doom(frame, shape):
+    frame = np.rollaxis(frame, 0, 3)
+    frame = skimage.color.rgb2gray(frame)
+    frame = skimage.transform.resize(frame, shape)
+    return np.array(frame).astype(np.float32)
+
+def skimage_atari(frame, shape):
+    frame = skimage.color.rgb2gray(frame)
+    frame = frame[35:191]
+    frame[frame < 0.5] = 0
+    frame[frame >= 0.5] = 255
+    frame = skimage.transform.resize(frame, shape)
+    return np.array(frame).astype(np.float32) / 255.0
+
+def sample_frame(height, width):
+    frame = cv2.cvtColor(cv2.imread('../sample.png'), cv2.COLOR_BGR2RGB)
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+def timeit(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+def equivalence_test(shape=(84, 84), mean_tolerance=0.01, edge_tolerance=0.2):
+    doom = np.rollaxis(sample_frame(480, 640), 2, 0)
+    atari = sample_frame(210, 160)
+
+    cases = [
+        ('Doom', skimage_doom(doom, shape), preprocess_frames(doom[np.newaxis], shape, axis=1)[0]),
+        ('Atari', skimage_atari(atari, shape), preprocess_frames(atari[np.newaxis], shape, crop=(35, 191), threshold=128)[0])]
+
+    for name, reference, frame in cases:
+        error = np.abs(reference - frame.astype(np.float32) / 255.0)
+        print("{} equivalence, Mean error: {:.4f}, 99th percentile: {:.4f}, Max error: {:.4f}".format(name, error.mean(), np.percentile(error, 99), error.max()))
+        assert frame.dtype == np.uint8 and frame.shape == tuple(shape)
+        assert error.mean() < mean_tolerance and np.percentile(error, 99) < edge_tolerance
+
+    batch = np.stack([doom, doom[:, ::-1], doom[:, :, ::-1]])
+    frames = preprocess_frames(batch, shape, axis=1)
+    for i in range(len(batch)):
+        assert np.array_equal(frames[i], preprocess_frames(batch[i:i+1], shape, axis=1)[0])
+
+def preprocess_benchmark(shape=(84, 84), n_envs=(1, 8), repeats=100):
+    doom = np.rollaxis(sample_frame(480, 640), 2, 0)
+
+    for n in n_envs:
+        batch = np.stack([doom] * n)
+
+        def skimage_step():
+            return [skimage_doom(frame, shape) for frame in batch]
+
+        def cv2_step():
+            return preprocess_frames(batch, shape, axis=1)
+
+        def cv2_frame_step():
+            return [preprocess_frames(frame[np.newaxis], shape, axis=1)[0] for frame in batch]
+
+        print("Preprocess 640x480, Envs: {}, Skimage: {:.3f} ms, Cv2 per frame: {:.3f} ms, Cv2 batch: {:.3f} ms".format(
+            n, timeit(skimage_step, repeats), timeit(cv2_frame_step, repeats), timeit(cv2_step, repeats)))
+
+def render_benchmark(config_name='doom-dqn-defend_the_center', profiles=('human', 'train'), steps=500):
+    from wrappers.doom import Sandbox as DoomSandbox
+    from utils import load_config
+
+    config = dict(load_config('../ddqn/config.yml')[config_name], visible=False)
+
+    for profile in profiles:
+        sandbox = DoomSandbox(config)
+        env, action_space = sandbox.build_env(config['env_name'], profile=profile)
+        terminal, state, info = sandbox.reset(env)
+
+        def step():
+            nonlocal info
+            state, reward, terminal, info = sandbox.step(env, np.random.randint(action_space), info)
+
+        shape = sandbox.game_state(env).screen_buffer.shape
+        print("Render profile: {}, Screen: {}, Throughput: {:.1f} steps/s".format(profile, shape, 1000.0 / timeit(step, steps)))
+        env.close()
+
+def atari_benchmark(config_name='pong-dqn', n_envs=(1, 4), steps=500):
+    from wrappers.gym_atari import Sandbox as AtariSandbox
+    from wrappers.vec import VecSandbox
+    from utils import load_config
+
+    config = dict(load_config('../ddqn/config.yml')[config_name], visible=False)
+
+    sandbox = AtariSandbox(config)
+    env, action_space = sandbox.build_env(config['env_name'])
+    terminal, state, info = sandbox.reset(env)
+
+    def step():
+        return sandbox.step(env, np.random.randint(action_space), info)
+
+    print("Atari, Sandbox, Throughput: {:.1f} steps/s".format(1000.0 / timeit(step, steps)))
+    env.close()
+
+    for n in n_envs:
+        vec, action_space = VecSandbox(AtariSandbox, config, n).build_env(config['env_name'])
+        vec.reset()
+
+        def vec_step():
+            return vec.step(np.random.randint(action_space, size=n))
+
+        print("Atari, VecSandbox, Envs: {}, Throughput: {:.1f} steps/s".format(n, n * 1000.0 / timeit(vec_step, steps)))
+        vec.close()
+
+# -----------------------------
+
+equivalence_test()
+preprocess_benchmark()
+render_benchmark()
+atari_benchmark()
@@ -3,8 +3,42 @@
 import vizdoom
 import numpy as np
 
-import skimage
-from skimage import transform, color
+from wrappers.preprocess import preprocess_frames
+from wrappers.frame_stack import FrameStack
+
+def training_resolution(input_shape):
+    resolutions = []
+    for name, resolution in vizdoom.ScreenResolution.__members__.items():
+        width, height = [int(x) for x in name[4:].split('X')]
+        if width * 3 == height * 4 and width >= input_shape[1] and height >= input_shape[0]:
+            resolutions.append((width * height, resolution))
+    return min(resolutions, key=lambda x: x[0])[1]
+
+class StepResult(tuple):
+    def __new__(cls, values, game_state):
+        result = super().__new__(cls, values)
+        result.GAME_STATE = game_state
+        return result
+
+    @property
+    def screen(self):
+        return self.GAME_STATE.screen_buffer
+
+    @property
+    def depth(self):
+        return self.GAME_STATE.depth_buffer
+
+    @property
+    def labels(self):
+        return self.GAME_STATE.labels_buffer
+
+    @property
+    def automap(self):
+        return self.GAME_STATE.automap_buffer
+
+    @property
+    def objects(self):
+        return self.GAME_STATE.labels
 
 class Sandbox:
     def __init__(self, config):
@@ -15,15 +49,29 @@ class Sandbox:
         self.VISIBLE = config['visible']
         self.FACTOR = config['reward_factor']
 
-        self.STACK = np.zeros((config['input_shape'][0], config['input_shape'][1], config['window_length']))
+        self.STACKS = {}
+        self.STATES = {}
 
-    def build_env(self, config_path, AOV=False):
+    def build_env(self, config_path, AOV=False, profile='train'):
         env = vizdoom.DoomGame()
         env.load_config(config_path)
 
-        env.set_screen_resolution(vizdoom.ScreenResolution.RES_640X480)
         env.set_window_visible(self.VISIBLE)
         env.set_render_hud(False)
+        env.set_render_crosshair(False)
+        env.set_render_particles(False)
+        env.set_render_effects_sprites(False)
+        env.set_render_decals(False)
+        env.set_render_messages(False)
+
+        if profile == 'train' and not AOV:
+            env.set_screen_resolution(training_resolution(self.INPUT_SHAPE))
+            env.set_screen_format(vizdoom.ScreenFormat.GRAY8)
+            env.set_depth_buffer_enabled(False)
+            env.set_labels_buffer_enabled(False)
+            env.set_automap_buffer_enabled(False)
+        else:
+            env.set_screen_resolution(vizdoom.ScreenResolution.RES_640X480)
 
         if AOV:
             env.set_depth_buffer_enabled(True)
@@ -45,57 +93,54 @@ class Sandbox:
         return env, action_space
 
     def preprocess(self, frame):
-        frame = np.rollaxis(frame, 0, 3)
-        frame = skimage.color.rgb2gray(frame)
-        frame = skimage.transform.resize(frame, self.INPUT_SHAPE)
-        frame = np.array(frame).astype(np.float32)
-        return frame
+        frame = preprocess_frames(frame[np.newaxis], self.INPUT_SHAPE, axis=1)[0]
+        return frame.astype(np.float32) / 255.0
+
+    def stack(self, env):
+        if env not in self.STACKS:
+            self.STACKS[env] = FrameStack(self.INPUT_SHAPE, self.WINDOW_LENGTH)
+        return self.STACKS[env]
 
-    def framestack(self, state):
-        frame = self.preprocess(state)
-        self.STACK = np.roll(self.STACK, 1, axis=2)
-        self.STACK[:,:,0] = frame
-        return self.STACK
+    def framestack(self, env, state):
+        return self.stack(env).push(self.preprocess(state))
 
     def async_stack(self, state, image_memory):
-        frame = self.preprocess(state)
+        return image_memory.push(self.preprocess(state))
 
-        if image_memory.shape == (1,*self.STACK):
-            image_memory = np.squeeze(image_memory)
+    def observe(self, env):
+        self.STATES[env] = env.get_state()
+        return self.STATES[env]
 
-        image_memory = np.roll(image_memory, 1, axis=2)
-        image_memory[:,:,0] = frame
-        return image_memory
+    def game_state(self, env):
+        if env not in self.STATES:
+            return self.observe(env)
+        return self.STATES[env]
 
     def reset(self, env):
         env.new_episode()
         terminal = False
-        state = env.get_state()
-        info = state.game_variables
+        game_state = self.observe(env)
+        info = game_state.game_variables
 
-        frame = state.screen_buffer
-        for _ in range(self.WINDOW_LENGTH):
-            state = self.framestack(frame)
-        return terminal, state, info
+        state = self.stack(env).reset(self.preprocess(game_state.screen_buffer))
+        return StepResult((terminal, state, info), game_state)
 
     def async_reset(self, env):
-        image_memory = self.STACK
+        image_memory = FrameStack(self.INPUT_SHAPE, self.WINDOW_LENGTH)
         env.new_episode()
         terminal = False
-        state = env.get_state()
-        info = state.game_variables
+        game_state = self.observe(env)
+        info = game_state.game_variables
 
-        frame = state.screen_buffer
-        for _ in range(self.WINDOW_LENGTH):
-            state = self.async_stack(frame, image_memory)
-        return terminal, state, info, image_memory
+        state = image_memory.reset(self.preprocess(game_state.screen_buffer))
+        return StepResult((terminal, state, info, image_memory), game_state)
 
     def one_hot(self, env, action_idx):
         action = np.zeros([env.get_available_buttons_size()])
         action[action_idx] = 1
         return action
 
-    def step(self, env, action_idx, prev_info):
+    def advance(self, env, action_idx):
         action = np.zeros([env.get_available_buttons_size()])
         action[action_idx] = 1
         action = action.astype(int)
@@ -103,45 +148,29 @@ class Sandbox:
         env.set_action(action.tolist())
         env.advance_action(self.FPS)
 
-        state = env.get_state()
         terminal = env.is_episode_finished()
         reward = env.get_last_reward()
 
         if terminal:
             env.new_episode()
-            state = env.get_state()
-            next_frame = state.screen_buffer
-            info = state.game_variables
-
-        next_frame = state.screen_buffer
-        next_state = self.framestack(next_frame)
-        info = state.game_variables
-        reward = self.shape_reward(reward, self.FACTOR, info, prev_info)
-        return next_state, reward, terminal, info
 
-    def async_step(self, env, action_idx, prev_info, image_memory):
-        action = np.zeros([env.get_available_buttons_size()])
-        action[action_idx] = 1
-        action = action.astype(int)
+        return self.observe(env), reward, terminal
 
-        env.set_action(action.tolist())
-        env.advance_action(self.FPS)
+    def step(self, env, action_idx, prev_info):
+        game_state, reward, terminal = self.advance(env, action_idx)
 
-        state = env.get_state()
-        terminal = env.is_episode_finished()
-        reward = env.get_last_reward()
+        next_state = self.framestack(env, game_state.screen_buffer)
+        info = game_state.game_variables
+        reward = self.shape_reward(reward, self.FACTOR, info, prev_info)
+        return StepResult((next_state, reward, terminal, info), game_state)
 
-        if terminal:
-            env.new_episode()
-            state = env.get_state()
-            next_frame = state.screen_buffer
-            info = state.game_variables
+    def async_step(self, env, action_idx, prev_info, image_memory):
+        game_state, reward, terminal = self.advance(env, action_idx)
 
-        next_frame = state.screen_buffer
-        next_state = self.async_stack(next_frame, image_memory)
-        info = state.game_variables
+        next_state = self.async_stack(game_state.screen_buffer, image_memory)
+        info = game_state.game_variables
         reward = self.shape_reward(reward, self.FACTOR, info, prev_info)
-        return next_state, reward, terminal, info
+        return StepResult((next_state, reward, terminal, info), game_state)
 
     def shape_reward(self, reward, factor, info, prev_info):
         reward *= factor
@@ -158,7 +187,7 @@ class Sandbox:
         return reward
 
     def view_human(self, env):
-        state = env.get_state()
-        frame = state.screen_buffer
-        frame = np.rollaxis(frame, 0, 3)
+        frame = self.game_state(env).screen_buffer
+        if frame.ndim == 3:
+            frame = np.rollaxis(frame, 0, 3)
         return frame
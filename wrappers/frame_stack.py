@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+class FrameStack:
+    def __init__(self, shape, window_length, slack=None, dtype=np.float32):
+        self.WINDOW_LENGTH = window_length
+        self.SLACK = 2 * window_length if slack is None else max(slack, window_length)
+        self.BUFFER = np.zeros((window_length + self.SLACK, shape[0], shape[1]), dtype=dtype)
+        self.POINTER = self.SLACK
+
+    def push(self, frame):
+        if self.POINTER == 0:
+            self.BUFFER[self.SLACK + 1:] = self.BUFFER[:self.WINDOW_LENGTH - 1]
+            self.POINTER = self.SLACK + 1
+
+        self.POINTER -= 1
+        self.BUFFER[self.POINTER] = frame
+        return self.view()
+
+    def reset(self, frame):
+        self.POINTER = self.SLACK
+        self.BUFFER[self.POINTER:] = frame
+        return self.view()
+
+    def view(self):
+        return self.BUFFER[self.POINTER:self.POINTER + self.WINDOW_LENGTH].transpose(1, 2, 0)
+
+    def copy(self, out=None):
+        if out is None:
+            return np.ascontiguousarray(self.view())
+        out[...] = self.view()
+        return out
@@ -3,8 +3,8 @@
 import gym
 import numpy as np
 
-import skimage
-from skimage import transform, color
+from wrappers.preprocess import preprocess_frames
+from wrappers.frame_stack import FrameStack
 
 class Sandbox:
     def __init__(self, config):
@@ -13,37 +13,42 @@ class Sandbox:
         self.GRADE = config['grade']
         self.VISIBLE = config['visible']
         self.FPS = config['fps']
-        self.STACK = np.zeros((config['input_shape'][0], config['input_shape'][1], config['window_length']))
+        self.STACKS = {}
+        self.POOLS = {}
 
-    def build_env(self, env_name):
+    def build_env(self, env_name, profile='train'):
         env = gym.make(env_name)
         action_space = env.action_space.n
         return env, action_space
 
-    def preprocess(self, frame):
-        frame = skimage.color.rgb2gray(frame)
-
+    def preprocess(self, frame, maxpool=False):
         if self.GRADE:
-            frame = frame[35:191]
-            frame[frame < 0.5] = 0
-            frame[frame >= 0.5] = 255
+            frame = preprocess_frames(frame[np.newaxis], self.INPUT_SHAPE, crop=(35, 191), threshold=128, maxpool=maxpool)[0]
+        else:
+            frame = preprocess_frames(frame[np.newaxis], self.INPUT_SHAPE, maxpool=maxpool)[0]
+        return frame.astype(np.float32) / 255.0
 
-        frame = skimage.transform.resize(frame, self.INPUT_SHAPE)
-        frame = np.array(frame).astype(np.float32) / 255.0
-        return frame
+    def pool(self, env):
+        if env not in self.POOLS:
+            self.POOLS[env] = np.zeros((2,) + env.observation_space.shape, dtype=np.uint8)
+        return self.POOLS[env]
+
+    def stack(self, env):
+        if env not in self.STACKS:
+            self.STACKS[env] = FrameStack(self.INPUT_SHAPE, self.WINDOW_LENGTH)
+        return self.STACKS[env]
+
+    def framestack(self, env, state):
+        return self.stack(env).push(self.preprocess(state))
 
-    def framestack(self, state):
-        frame = self.preprocess(state)
-        self.STACK = np.roll(self.STACK, 1, axis=2)
-        self.STACK[:,:,0] = frame
-        return self.STACK
+    def variables(self, env):
+        return np.array([env.unwrapped.ale.lives()], dtype=np.float32)
 
     def reset(self, env):
         frame = env.reset()
         terminal = False
-        info = None
-        for _ in range(self.WINDOW_LENGTH):
-            state = self.framestack(frame)
+        info = self.variables(env)
+        state = self.stack(env).reset(self.preprocess(frame))
         return terminal, state, info
 
     def step(self, env, action, prev_info):
@@ -51,19 +56,20 @@ class Sandbox:
             env.render()
 
         total_reward = 0.0
-        buffer = np.zeros((2,) + env.observation_space.shape, dtype=np.uint8)
+        buffer = self.pool(env)
         for i in range(self.FPS):
-            next_state, reward, terminal, info = env.step(action)
+            next_state, reward, terminal, _ = env.step(action)
             if i == self.FPS - 2: buffer[0] = next_state
             if i == self.FPS - 1: buffer[1] = next_state
             total_reward += reward
             if terminal:
+                buffer[max(i - self.FPS + 3, 0):] = 0
                 _, state, info = self.reset(env)
                 terminal = True
                 break
 
-        max_frame = buffer.max(axis=0)
-        next_state = self.framestack(max_frame)
+        next_state = self.stack(env).push(self.preprocess(buffer, maxpool=True))
+        info = self.variables(env)
 
         total_reward = self.shape_reward(total_reward)
         return next_state, total_reward, terminal, info
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import cv2
+import numpy as np
+
+LUMA = (54, 183, 19) # skimage rgb2gray weights in 1/256 fixed point
+
+def grayscale(frames, axis=-1):
+    channels = np.moveaxis(frames, axis, 0)
+    gray = np.multiply(channels[0], LUMA[0], dtype=np.uint16)
+    gray += np.multiply(channels[1], LUMA[1], dtype=np.uint16)
+    gray += np.multiply(channels[2], LUMA[2], dtype=np.uint16)
+    gray += 128
+    gray >>= 8
+    return gray.astype(np.uint8)
+
+def resize(frame, shape, output):
+    if frame.shape == tuple(shape):
+        output[:] = frame
+    else:
+        cv2.resize(frame, (shape[1], shape[0]), dst=output, interpolation=cv2.INTER_AREA)
+    return output
+
+def preprocess_frames(frames, shape, axis=-1, crop=None, threshold=None, maxpool=False):
+    frames = np.asarray(frames, dtype=np.uint8)
+    color = frames.ndim - int(maxpool) == 4
+
+    if crop is not None:
+        rows = (2 if color and axis % 4 == 1 else 1) + int(maxpool)
+        frames = frames[(slice(None),) * rows + (slice(crop[0], crop[1]),)]
+
+    # Each frame runs the whole pipeline before the next so intermediates stay in cache
+    output = np.empty((len(frames), shape[0], shape[1]), dtype=np.uint8)
+    for i in range(len(frames)):
+        frame = frames[i:i+1]
+        if maxpool:
+            frame = np.maximum(frame[:, 0], frame[:, 1])
+
+        gray = grayscale(frame, axis) if color else frame
+
+        if threshold is not None:
+            gray = np.where(gray >= threshold, np.uint8(255), np.uint8(0))
+
+        resize(gray[0], shape, output[i])
+    return output
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import time
+import numpy as np
+
+from wrappers.preprocess import preprocess_frames
+from wrappers.frame_stack import FrameStack
+
+class SyntheticEnv:
+    def __init__(self, frame_shape, variables, action_space, episode_length, step_cost, seed, bank=64):
+        self.ACTION_SPACE = action_space
+        self.EPISODE_LENGTH = episode_length
+        self.STEP_COST = step_cost
+        self.SEED = seed
+
+        random = np.random.RandomState(seed)
+        self.FRAMES = random.randint(0, 256, size=(bank,) + tuple(frame_shape), dtype=np.uint8)
+        self.TARGETS = random.randint(0, action_space, size=episode_length)
+        self.VARIABLES = np.zeros(variables, dtype=np.float64)
+
+        self.EPISODE = 0
+        self.TICK = 0
+        self.FRAME = self.FRAMES[0]
+
+    def new_episode(self):
+        self.EPISODE += 1
+        self.TICK = 0
+        self.VARIABLES[:] = 0
+        self.VARIABLES[1:] = 100
+        self.FRAME = self.FRAMES[self.EPISODE % len(self.FRAMES)]
+        return self.FRAME
+
+    def step(self, action, repeat=1):
+        if self.STEP_COST:
+            time.sleep(self.STEP_COST * repeat)
+
+        reward = float(action == self.TARGETS[self.TICK])
+        self.TICK += 1
+        if len(self.VARIABLES):
+            self.VARIABLES[0] += reward
+        if len(self.VARIABLES) > 1:
+            self.VARIABLES[1:] -= 1 - reward
+
+        self.FRAME = self.FRAMES[(self.EPISODE + self.TICK * (action + 1)) % len(self.FRAMES)]
+        terminal = self.TICK >= self.EPISODE_LENGTH
+        return self.FRAME, reward, terminal, self.VARIABLES.copy()
+
+    def close(self):
+        pass
+
+class Sandbox:
+    def __init__(self, config):
+        self.INPUT_SHAPE = config['input_shape']
+        self.WINDOW_LENGTH = config['window_length']
+        self.FPS = config['fps']
+        self.VISIBLE = config['visible']
+        self.FACTOR = config['reward_factor']
+
+        self.FRAME_SHAPE = config['synthetic_frame']
+        self.VARIABLES = config['synthetic_variables']
+        self.ACTIONS = config['synthetic_actions']
+        self.EPISODE_LENGTH = config['synthetic_episode_length']
+        self.STEP_COST = config['synthetic_step_cost']
+        self.SEED = config['synthetic_seed']
+
+        self.STACKS = {}
+        self.ENVS = config['env_index']
+
+    def build_env(self, env_name, AOV=False, profile='train'):
+        env = SyntheticEnv(self.FRAME_SHAPE, self.VARIABLES, self.ACTIONS, self.EPISODE_LENGTH, self.STEP_COST, self.SEED + self.ENVS)
+        self.ENVS += 1
+        return env, self.ACTIONS
+
+    def preprocess(self, frame):
+        frame = preprocess_frames(frame[np.newaxis], self.INPUT_SHAPE, axis=1)[0]
+        return frame.astype(np.float32) / 255.0
+
+    def stack(self, env):
+        if env not in self.STACKS:
+            self.STACKS[env] = FrameStack(self.INPUT_SHAPE, self.WINDOW_LENGTH)
+        return self.STACKS[env]
+
+    def framestack(self, env, state):
+        return self.stack(env).push(self.preprocess(state))
+
+    def async_stack(self, state, image_memory):
+        return image_memory.push(self.preprocess(state))
+
+    def reset(self, env):
+        frame = env.new_episode()
+        terminal = False
+        info = env.VARIABLES.copy()
+        state = self.stack(env).reset(self.preprocess(frame))
+        return terminal, state, info
+
+    def async_reset(self, env):
+        image_memory = FrameStack(self.INPUT_SHAPE, self.WINDOW_LENGTH)
+        frame = env.new_episode()
+        terminal = False
+        info = env.VARIABLES.copy()
+        state = image_memory.reset(self.preprocess(frame))
+        return terminal, state, info, image_memory
+
+    def one_hot(self, env, action_idx):
+        action = np.zeros([env.ACTION_SPACE])
+        action[action_idx] = 1
+        return action
+
+    def advance(self, env, action_idx):
+        next_frame, reward, terminal, info = env.step(action_idx, self.FPS)
+        if terminal:
+            next_frame = env.new_episode()
+            info = env.VARIABLES.copy()
+        return next_frame, reward * self.FACTOR, terminal, info
+
+    def step(self, env, action_idx, prev_info):
+        next_frame, reward, terminal, info = self.advance(env, action_idx)
+        next_state = self.framestack(env, next_frame)
+        return next_state, reward, terminal, info
+
+    def async_step(self, env, action_idx, prev_info, image_memory):
+        next_frame, reward, terminal, info = self.advance(env, action_idx)
+        next_state = self.async_stack(next_frame, image_memory)
+        return next_state, reward, terminal, info
+
+    def view_human(self, env):
+        frame = env.FRAME
+        if frame.ndim == 3:
+            frame = np.rollaxis(frame, 0, 3)
+        return frame
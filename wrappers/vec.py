@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import ctypes
+import numpy as np
+import multiprocessing as mp
+
+def worker(remote, sandbox_class, config, env_name, buffer, shape, dtype, index):
+    observations = np.frombuffer(buffer, dtype=dtype).reshape(shape)
+
+    sandbox = sandbox_class(dict(config, env_index=index))
+    env, action_space = sandbox.build_env(env_name)
+    remote.send(action_space)
+
+    info = None
+    while True:
+        command, data = remote.recv()
+
+        if command == 'reset':
+            terminal, state, info = sandbox.reset(env)
+            observations[index] = state
+            remote.send((terminal, info))
+
+        elif command == 'step':
+            state, reward, terminal, info = sandbox.step(env, data, info)
+            observations[index] = state
+            remote.send((reward, terminal, info))
+
+        elif command == 'close':
+            env.close()
+            remote.close()
+            break
+
+class VecSandbox:
+    def __init__(self, sandbox_class, config, n_envs, groups=1, dtype=np.float32):
+        self.SANDBOX_CLASS = sandbox_class
+        self.CONFIG = config
+        self.N_ENVS = n_envs
+        self.DTYPE = np.dtype(dtype)
+        self.SHAPE = (n_envs, config['input_shape'][0], config['input_shape'][1], config['window_length'])
+
+        bounds = np.linspace(0, n_envs, groups + 1).astype(int)
+        self.GROUPS = [slice(bounds[i], bounds[i + 1]) for i in range(groups)]
+
+        self.BUFFER = mp.RawArray(ctypes.c_uint8, int(np.prod(self.SHAPE)) * self.DTYPE.itemsize)
+        self.OBSERVATIONS = np.frombuffer(self.BUFFER, dtype=self.DTYPE).reshape(self.SHAPE)
+
+        self.REMOTES = []
+        self.PROCESSES = []
+
+    def build_env(self, env_name):
+        for i in range(self.N_ENVS):
+            remote, child = mp.Pipe()
+            args = (child, self.SANDBOX_CLASS, self.CONFIG, env_name, self.BUFFER, self.SHAPE, self.DTYPE, i)
+            process = mp.Process(target=worker, args=args, daemon=True)
+            process.start()
+            child.close()
+
+            self.REMOTES.append(remote)
+            self.PROCESSES.append(process)
+
+        action_space = [remote.recv() for remote in self.REMOTES][0]
+        return self, action_space
+
+    def select(self, group):
+        if group is None:
+            return slice(0, self.N_ENVS)
+        return self.GROUPS[group]
+
+    def reset(self, group=None):
+        envs = self.select(group)
+        for remote in self.REMOTES[envs]:
+            remote.send(('reset', None))
+
+        terminals, infos = zip(*[remote.recv() for remote in self.REMOTES[envs]])
+        return np.array(terminals), self.OBSERVATIONS[envs], list(infos)
+
+    def step_async(self, actions, group=None):
+        for remote, action in zip(self.REMOTES[self.select(group)], actions):
+            remote.send(('step', int(action)))
+
+    def step_wait(self, group=None):
+        envs = self.select(group)
+        rewards, terminals, infos = zip(*[remote.recv() for remote in self.REMOTES[envs]])
+        return self.OBSERVATIONS[envs], np.array(rewards, dtype=np.float32), np.array(terminals), list(infos)
+
+    def step(self, actions, group=None):
+        self.step_async(actions, group)
+        return self.step_wait(group)
+
+    def pipeline(self, act):
+        # While the policy picks actions for one group, the other groups keep simulating
+        states, actions = [], []
+        for group in range(len(self.GROUPS)):
+            _, state, _ = self.reset(group)
+            states.append(state.copy())
+            actions.append(np.asarray(act(state, group)))
+            self.step_async(actions[group], group)
+
+        while True:
+            for group in range(len(self.GROUPS)):
+                state_next, rewards, terminals, infos = self.step_wait(group)
+                yield group, states[group], actions[group], state_next, rewards, terminals, infos
+
+                states[group] = state_next.copy()
+                actions[group] = np.asarray(act(state_next, group))
+                self.step_async(actions[group], group)
+
+    def close(self):
+        for remote in self.REMOTES:
+            remote.send(('close', None))
+        for process in self.PROCESSES:
+            process.join()